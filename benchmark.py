@@ -0,0 +1,546 @@
+"""
+Benchmarks of the algorithms of this repository on seeded synthetic data.
+
+    python benchmark.py [--scales 1 2 4] [--only k-means ...] [--output results.json] [--compare baseline.json]
+
+Every benchmark generates its data from a fixed seed at each scale and measures the best wall time over --repeat runs,
+the throughput in items (training rows, points or labels) per second and, in one extra run traced by tracemalloc, the
+peak Python memory. Separately from the timed scales, every benchmark with a reference implementation (the algorithm
+as it was first written, or the plain version of an optimized path) is run once on an input capped at its check_limit
+and its output compared with the reference's; any mismatch fails the run. The results and checks are written as JSON,
+and --compare reports the benchmarks that got slower than in an earlier result file.
+"""
+
+import argparse
+import collections
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import modules
+
+
+# Data generators
+def gaussian_blobs(
+    n: int, centers: int, dim: int, rng: random.Random, spread: float = 1.0
+) -> Tuple[List[List[float]], List[int]]:
+    # n points around centers random centers, and the center of every point
+    means = [[rng.uniform(-10, 10) for _ in range(dim)] for _ in range(centers)]
+    points, labels = [], []
+    for _ in range(n):
+        center = rng.randrange(centers)
+        points.append([rng.gauss(mean, spread) for mean in means[center]])
+        labels.append(center)
+    return points, labels
+
+
+def lattice_points(n: int, side: int, rng: random.Random) -> List[List[float]]:
+    # n points on a side x side integer grid, so many point pairs lie at exactly the same distance
+    return [[float(rng.randrange(side)), float(rng.randrange(side))] for _ in range(n)]
+
+
+def categorical_table(
+    n: int, attrs: int, values: int, classes: int, rng: random.Random
+) -> Tuple[List[List[int]], List[int]]:
+    # n rows of attrs categorical attributes, drawn from a different skewed distribution for every class 1..classes
+    weights = [
+        [[rng.random() ** 3 for _ in range(values)] for _ in range(attrs)]
+        for _ in range(classes)
+    ]
+    rows, labels = [], []
+    for _ in range(n):
+        label = rng.randrange(classes)
+        rows.append([rng.choices(range(values), w)[0] for w in weights[label]])
+        labels.append(label + 1)
+    return rows, labels
+
+
+def labeled_features(
+    n: int, dim: int, classes: int, rng: random.Random, decimals: int = 1
+) -> Tuple[List[List[float]], List[int]]:
+    # overlapping labeled blobs, rounded so the features have repeated values like measured data
+    points, labels = gaussian_blobs(n, classes, dim, rng, spread=4.0)
+    return [[round(x, decimals) for x in point] for point in points], labels
+
+
+def label_pairs(
+    n: int, true_k: int, pred_k: int, noise: float, rng: random.Random
+) -> Tuple[List[int], List[int]]:
+    # ground truth labels and a prediction that agrees with them up to noise
+    true_labels = [rng.randrange(true_k) for _ in range(n)]
+    pred_labels = [
+        rng.randrange(pred_k) if rng.random() < noise else t % pred_k
+        for t in true_labels
+    ]
+    return true_labels, pred_labels
+
+
+def split(
+    data: Sequence, labels: Sequence, test_fraction: float = 0.2
+) -> Tuple[Sequence, Sequence, Sequence]:
+    cut = int(len(data) * (1 - test_fraction))
+    return data[:cut], labels[:cut], data[cut:]
+
+
+def chunked(
+    data: Sequence, labels: Sequence, chunks: int
+) -> List[Tuple[Sequence, Sequence]]:
+    # data and labels cut into consecutive (data, labels) chunks
+    size = max(1, math.ceil(len(data) / chunks))
+    return [
+        (data[i : i + size], labels[i : i + size]) for i in range(0, len(data), size)
+    ]
+
+
+def canonical(labels: Sequence[int]) -> List[int]:
+    # relabel clusters in order of first appearance, so equal partitions compare equal
+    names: Dict[int, int] = {}
+    return [names.setdefault(label, len(names)) for label in labels]
+
+
+# Reference implementations
+def reference_tree(
+    train_data: List[List[float]],
+    train_label: List[int],
+    test_data: List[List[float]],
+    max_depth: int = 2,
+) -> List[int]:
+    # the decision tree as first written: every midpoint of every feature, scored from scratch
+    def info(counts: List[int], n: int) -> float:
+        return -sum((p := c / n) * math.log2(p) for c in counts if c > 0)
+
+    def split_info(data, labels, dim, point) -> float:
+        left = [y for x, y in zip(data, labels) if x[dim] <= point]
+        right = [y for x, y in zip(data, labels) if x[dim] > point]
+        total = 0.0
+        for side in (left, right):
+            if side:
+                counts = collections.Counter(side)
+                total += len(side) / len(data) * info([*counts.values()], len(side))
+        return total
+
+    def build(data, labels, depth):
+        counts = collections.Counter(labels)
+        label = min(k for k, v in counts.items() if v == max(counts.values()))
+        if len(data) == 0 or depth == max_depth or len(counts) == 1:
+            return label
+        base = info([*counts.values()], len(labels))
+        max_gain, best = float("-inf"), (0, 0.0)
+        for i in range(len(data[0])):
+            values = sorted(set(row[i] for row in data))
+            dim_gain, dim_point = float("-inf"), 0
+            for m in ((a + b) / 2 for a, b in zip(values, values[1:])):
+                gain = base - split_info(data, labels, i, m)
+                if gain > dim_gain:
+                    dim_gain, dim_point = gain, m
+            if dim_gain > max_gain:
+                max_gain, best = dim_gain, (i, dim_point)
+        dim, point = best
+        left = [(x, y) for x, y in zip(data, labels) if x[dim] <= point]
+        right = [(x, y) for x, y in zip(data, labels) if x[dim] > point]
+        return (
+            dim,
+            point,
+            build([x for x, _ in left], [y for _, y in left], depth + 1),
+            build([x for x, _ in right], [y for _, y in right], depth + 1),
+        )
+
+    root = build(train_data, train_label, 0)
+    results = []
+    for x in test_data:
+        node = root
+        while isinstance(node, tuple):
+            dim, point, left, right = node
+            node = left if x[dim] <= point else right
+        results.append(node)
+    return results
+
+
+def reference_naive_bayes(
+    X_train: List[List[int]], Y_train: List[int], X_test: List[List[int]], classes=7
+) -> List[int]:
+    # naive Bayes as first written: a product of smoothed probabilities per class
+    class_counts = [0] * classes
+    for label in Y_train:
+        class_counts[label - 1] += 1
+    priors = [(c + 0.1) / (len(Y_train) + 0.1 * classes) for c in class_counts]
+    counts = [collections.Counter() for _ in X_train[0]]
+    values = [set() for _ in X_train[0]]
+    for label, row in zip(Y_train, X_train):
+        for i, attr in enumerate(row):
+            counts[i][label, attr] += 1
+            values[i].add(attr)
+
+    results = []
+    for row in X_test:
+        best_prob, best_label = float("-inf"), -1
+        for label in range(1, classes + 1):
+            prob = priors[label - 1]
+            for i, attr in enumerate(row):
+                denominator = class_counts[label - 1] + 0.1 * len(values[i])
+                prob *= (counts[i].get((label, attr), 0) + 0.1) / denominator
+            if prob > best_prob:
+                best_prob, best_label = prob, label
+        results.append(best_label)
+    return results
+
+
+def reference_hclus(X: List[List[float]], K: int, linkage: Callable) -> List[int]:
+    # agglomerative clustering as first written: every cluster pair scored from its point pairs at every merge
+    def euclidean(p1, p2):
+        return math.sqrt(sum((a - b) ** 2 for a, b in zip(p1, p2)))
+
+    def dist(c1, c2):
+        return linkage([euclidean(X[p], X[q]) for p in c1 for q in c2])
+
+    clusters = [{i} for i in range(len(X))]
+    while len(clusters) > K:
+        best, to_merge = math.inf, (0, 1)
+        for i in range(len(clusters)):
+            for j in range(i + 1, len(clusters)):
+                d = dist(clusters[i], clusters[j])
+                if d < best:
+                    best, to_merge = d, (i, j)
+        i, j = to_merge
+        clusters[i] |= clusters.pop(j)
+    result = [0] * len(X)
+    for label, cluster in enumerate(clusters):
+        for p in cluster:
+            result[p] = label
+    return result
+
+
+def reference_jaccard(true_labels: List[int], pred_labels: List[int]) -> float:
+    # the Jaccard index over every pair of points
+    tp = fn = fp = 0
+    n = len(true_labels)
+    for i in range(n):
+        for j in range(i + 1, n):
+            same_g = true_labels[i] == true_labels[j]
+            same_c = pred_labels[i] == pred_labels[j]
+            tp += same_g and same_c
+            fn += same_g and not same_c
+            fp += same_c and not same_g
+    denominator = tp + fn + fp
+    return tp / denominator if denominator else 0
+
+
+def reference_nmi(true_labels: List[int], pred_labels: List[int]) -> float:
+    # the normalized mutual information as first written, from the confusion matrix
+    def entropy(clusters, total_data):
+        return -sum(
+            p * math.log(p) for v in clusters.values() if (p := v / total_data) != 0
+        )
+
+    n = len(true_labels)
+    matrix = dict(collections.Counter(zip(true_labels, pred_labels)))
+    cs = collections.defaultdict(int)
+    gs = collections.defaultdict(int)
+    for (true, pred), count in matrix.items():
+        gs[true] += count
+        cs[pred] += count
+
+    mi = 0
+    for (true, pred), count in matrix.items():
+        p_ij = count / n
+        mi += p_ij * math.log(p_ij / (gs[true] / n * (cs[pred] / n)))
+    denominator = math.sqrt(entropy(cs, n) * entropy(gs, n))
+    return mi / denominator if denominator else 0
+
+
+# Benchmarks
+class Benchmark:
+    """
+    One benchmark.
+
+    Attributes:
+    - name: The name of the benchmark
+    - size: The number of items at scale 1
+    - setup: Generates the input from the number of items and a seeded random generator
+    - run: Runs the measured code on the input and returns its output
+    - reference: Computes the expected output from the input, or None
+    - check_limit: The number of items of the input the output is checked against the reference on, at most size
+    """
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        setup: Callable[[int, random.Random], Any],
+        run: Callable[[Any], Any],
+        reference: Callable[[Any], Any] | None = None,
+        check_limit: int = 0,
+    ):
+        self.name = name
+        self.size = size
+        self.setup = setup
+        self.run = run
+        self.reference = reference
+        self.check_limit = check_limit
+
+
+def benchmarks() -> List[Benchmark]:
+    decision_tree = modules.load("decision_tree.py")
+    naive_bayes = modules.load("naive_bayes.py")
+    hclus = modules.load("hierarchical-clustering.py")
+    kmeans = modules.load("k-means.py")
+    evaluation = modules.load("clustering-evaluation.py")
+
+    def hclus_run(method):
+        def run(args):
+            X, K = args
+            hclus._dendrogram_cache.clear()
+            return canonical(getattr(hclus.Solution(), f"hclus_{method}_link")(X, K))
+
+        return run
+
+    def hclus_reference(linkage):
+        return lambda args: canonical(reference_hclus(*args, linkage))
+
+    def kmeans_run(algorithm):
+        def run(points):
+            model = kmeans.KMeans(seed=0, algorithm=algorithm).fit(points, 8)
+            return model.labels, model.sse
+
+        return run
+
+    def evaluation_run(args):
+        true_labels, pred_labels = args
+        scores = evaluation.ClusteringEvaluator(true_labels).evaluate(pred_labels)
+        return scores["jaccard"], scores["nmi"]
+
+    def evaluation_reference(args):
+        return reference_jaccard(*args), reference_nmi(*args)
+
+    def naive_bayes_chunked(args):
+        X_train, Y_train, X_test = args
+        model = naive_bayes.NaiveBayesModel().fit_chunks(chunked(X_train, Y_train, 7))
+        return model.predict(X_test)
+
+    def naive_bayes_sharded(args):
+        X_train, Y_train, X_test = args
+        model = naive_bayes.NaiveBayesModel().fit_sharded(
+            chunked(X_train, Y_train, 7), n_jobs=2
+        )
+        return model.predict(X_test)
+
+    return [
+        Benchmark(
+            "decision_tree",
+            4000,
+            lambda n, rng: split(*labeled_features(n, 6, 4, rng)),
+            lambda args: decision_tree.Solution().classify(*args),
+            lambda args: reference_tree(*args),
+            check_limit=1000,
+        ),
+        Benchmark(
+            "decision_tree_parallel",
+            2000,
+            lambda n, rng: split(*labeled_features(n, 6, 4, rng)),
+            lambda args: decision_tree.Solution(n_jobs=2, parallel_min_rows=1).classify(
+                *args
+            ),
+            lambda args: reference_tree(*args),
+            check_limit=1000,
+        ),
+        Benchmark(
+            "naive_bayes",
+            20000,
+            lambda n, rng: split(*categorical_table(n, 12, 6, 7, rng)),
+            lambda args: naive_bayes.Solution().label(*args),
+            lambda args: reference_naive_bayes(*args),
+            check_limit=100000,
+        ),
+        Benchmark(
+            "naive_bayes_chunked",
+            20000,
+            lambda n, rng: split(*categorical_table(n, 12, 6, 7, rng)),
+            naive_bayes_chunked,
+            lambda args: reference_naive_bayes(*args),
+            check_limit=100000,
+        ),
+        Benchmark(
+            "naive_bayes_sharded",
+            20000,
+            lambda n, rng: split(*categorical_table(n, 12, 6, 7, rng)),
+            naive_bayes_sharded,
+            lambda args: reference_naive_bayes(*args),
+            check_limit=100000,
+        ),
+        Benchmark(
+            "hclus_single",
+            800,
+            lambda n, rng: (gaussian_blobs(n, 5, 2, rng)[0], 5),
+            hclus_run("single"),
+            hclus_reference(min),
+            check_limit=60,
+        ),
+        Benchmark(
+            "hclus_single_lattice",
+            800,
+            lambda n, rng: (lattice_points(n, 8, rng), 10),
+            hclus_run("single"),
+            hclus_reference(min),
+            check_limit=60,
+        ),
+        Benchmark(
+            "hclus_complete",
+            400,
+            lambda n, rng: (gaussian_blobs(n, 5, 2, rng)[0], 5),
+            hclus_run("complete"),
+            hclus_reference(max),
+            check_limit=60,
+        ),
+        Benchmark(
+            "hclus_average",
+            400,
+            lambda n, rng: (gaussian_blobs(n, 5, 2, rng)[0], 5),
+            hclus_run("average"),
+            hclus_reference(lambda d: sum(d) / len(d)),
+            check_limit=60,
+        ),
+        Benchmark(
+            "k-means",
+            10000,
+            lambda n, rng: [tuple(p) for p in gaussian_blobs(n, 8, 4, rng)[0]],
+            kmeans_run("hamerly"),
+            kmeans_run("lloyd"),
+            check_limit=20000,
+        ),
+        Benchmark(
+            "clustering_evaluation",
+            200000,
+            lambda n, rng: label_pairs(n, 10, 12, 0.3, rng),
+            evaluation_run,
+            evaluation_reference,
+            check_limit=2000,
+        ),
+    ]
+
+
+def generate(benchmark: Benchmark, n: int) -> Any:
+    return benchmark.setup(n, random.Random(f"{benchmark.name}-{n}"))
+
+
+def measure(benchmark: Benchmark, scale: float, repeat: int, memory: bool) -> dict:
+    n = max(2, int(benchmark.size * scale))
+    data = generate(benchmark, n)
+
+    seconds = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = benchmark.run(data)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        benchmark.run(data)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "benchmark": benchmark.name,
+        "scale": scale,
+        "n": n,
+        "seconds": seconds,
+        "throughput": n / seconds if seconds else None,
+        "peak_bytes": peak,
+    }
+
+
+def check(benchmark: Benchmark) -> dict:
+    # run once on a size-capped input and compare with the reference
+    n = max(2, min(benchmark.size, benchmark.check_limit))
+    data = generate(benchmark, n)
+    return {
+        "benchmark": benchmark.name,
+        "n": n,
+        "matches_reference": benchmark.run(data) == benchmark.reference(data),
+    }
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    # the benchmarks slower than in the baseline by more than the tolerance
+    before = {(r["benchmark"], r["n"]): r["seconds"] for r in baseline}
+    regressions = []
+    for result in results:
+        old = before.get((result["benchmark"], result["n"]))
+        if old and result["seconds"] > old * (1 + tolerance):
+            regressions.append(
+                f"{result['benchmark']} n={result['n']}: "
+                f"{old:.3f}s -> {result['seconds']:.3f}s"
+            )
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--scales", type=float, nargs="+", default=[0.25, 1.0], help="size multipliers"
+    )
+    parser.add_argument("--only", nargs="+", help="the benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per scale")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the traced memory run"
+    )
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON result file to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="the slowdown reported as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    selected = [b for b in benchmarks() if args.only is None or b.name in args.only]
+    results, checks = [], []
+    for benchmark in selected:
+        if benchmark.reference is not None:
+            result = check(benchmark)
+            checks.append(result)
+            print(
+                f"{result['benchmark']:<22} n={result['n']:<8} "
+                + ("ok" if result["matches_reference"] else "MISMATCH")
+            )
+        for scale in args.scales:
+            result = measure(benchmark, scale, args.repeat, not args.no_memory)
+            results.append(result)
+            peak = result["peak_bytes"]
+            print(
+                f"{result['benchmark']:<22} n={result['n']:<8} "
+                f"{result['seconds']:9.3f}s {result['throughput']:12.0f}/s"
+                + (f" {peak / 2**20:8.1f} MiB" if peak is not None else "")
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                    "checks": checks,
+                },
+                f,
+                indent=2,
+            )
+
+    failed = not all(c["matches_reference"] for c in checks)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+        for regression in regressions:
+            print(f"slower: {regression}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 # Submit this file to Gradescope
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
 # from enum import Enum
 from collections import Counter, defaultdict
@@ -30,20 +30,7 @@ class Solution:
         Returns:
           The Jaccard index. Do NOT round this value.
         """
-        n = len(true_labels)
-        tp, fn, fp = 0, 0, 0
-        for i in range(n):
-            for j in range(i + 1, n):
-                is_g_equal = true_labels[i] == true_labels[j]
-                is_c_equal = pred_labels[i] == pred_labels[j]
-                if is_g_equal and is_c_equal:
-                    tp += 1
-                elif is_g_equal and not is_c_equal:
-                    fn += 1
-                elif not is_g_equal and is_c_equal:
-                    fp += 1
-        denominator = tp + fn + fp
-        return tp / denominator if denominator else 0
+        return Contingency(self.confusion_matrix(true_labels, pred_labels)).jaccard()
 
     def nmi(self, true_labels: List[int], pred_labels: List[int]) -> float:
         """Calculate the normalized mutual information.
@@ -53,26 +40,58 @@ class Solution:
         Returns:
           The normalized mutual information. Do NOT round this value.
         """
+        return Contingency(self.confusion_matrix(true_labels, pred_labels)).nmi()
 
-        # helper for the entropy function
-        def entropy(clusters: dict[int, int], total_data: int) -> float:
-            return -sum(
-                p * math.log(p) for v in clusters.values() if (p := v / total_data) != 0
-            )
 
-        n = len(true_labels)
-        matrix = self.confusion_matrix(true_labels, pred_labels)
+class Contingency:
+    """The contingency table of a ground truth G and a clustering C, and the metrics derived from it.
+
+    Args:
+      matrix: the sparse confusion matrix, (true_label, pred_label): count
+      gs: the size of every ground truth partition, if already known (in order of first appearance)
+      h_g: the entropy of the ground truth, if already known
+    """
+
+    def __init__(
+        self,
+        matrix: Dict[Tuple[int, int], int],
+        gs: Dict[int, int] | None = None,
+        h_g: float | None = None,
+    ):
+        self.matrix = matrix
 
         # Get clusters and ground truth
         cs = defaultdict(int)
-        gs = defaultdict(int)
-        for (true, pred), count in matrix.items():
-            gs[true] = gs[true] + count
-            cs[pred] = cs[pred] + count
+        if gs is None:
+            gs = defaultdict(int)
+            for (true, pred), count in matrix.items():
+                gs[true] += count
+                cs[pred] += count
+        else:
+            for (true, pred), count in matrix.items():
+                cs[pred] += count
+        self.gs = gs
+        self.cs = cs
+        self.n = sum(gs.values())
+        self.h_g = entropy(gs, self.n) if h_g is None else h_g
+
+        # count the pairs: a pair is together in G and C when both points share a cell, together in G when both share
+        # a row and together in C when both share a column
+        self.tp = sum(pairs(count) for count in matrix.values())
+        self.fn = sum(pairs(count) for count in gs.values()) - self.tp
+        self.fp = sum(pairs(count) for count in cs.values()) - self.tp
+        self.tn = pairs(self.n) - self.tp - self.fn - self.fp
+
+    def jaccard(self) -> float:
+        denominator = self.tp + self.fn + self.fp
+        return self.tp / denominator if denominator else 0
+
+    def nmi(self) -> float:
+        n, gs, cs = self.n, self.gs, self.cs
 
         # caluculate the mutual information
         mi = 0
-        for (true, pred), count in matrix.items():
+        for (true, pred), count in self.matrix.items():
             p_ij = count / n
             p_gi = gs[true] / n
             p_ci = cs[pred] / n
@@ -80,10 +99,156 @@ class Solution:
 
         # calculate entropies for c and g
         h_c = entropy(cs, n)
-        h_g = entropy(gs, n)
-        denominator = math.sqrt(h_c * h_g)
+        denominator = math.sqrt(h_c * self.h_g)
         return mi / denominator if denominator else 0
 
+    def rand(self) -> float:
+        denominator = pairs(self.n)
+        return (self.tp + self.tn) / denominator if denominator else 0
+
+    def adjusted_rand(self) -> float:
+        total = pairs(self.n)
+        if not total:
+            return 0
+        same_g = self.tp + self.fn
+        same_c = self.tp + self.fp
+        expected = same_g * same_c / total
+        denominator = (same_g + same_c) / 2 - expected
+        return (self.tp - expected) / denominator if denominator else 0
+
+    def purity(self) -> float:
+        # every cluster counts the points of its majority partition
+        majority = defaultdict(int)
+        for (true, pred), count in self.matrix.items():
+            majority[pred] = max(majority[pred], count)
+        return sum(majority.values()) / self.n if self.n else 0
+
+    def f_measure(self) -> float:
+        # the F-measure of every cluster against its majority partition (the smaller partition on ties), averaged
+        # over the clusters
+        majority: Dict[int, Tuple[int, int]] = {}
+        for (true, pred), count in self.matrix.items():
+            candidate = (count, -self.gs[true])
+            if pred not in majority or candidate > majority[pred]:
+                majority[pred] = candidate
+
+        total = 0
+        for pred, (count, minus_size) in majority.items():
+            precision = count / self.cs[pred]
+            recall = count / -minus_size
+            total += 2 * precision * recall / (precision + recall)
+        return total / len(majority) if majority else 0
+
+
+METRICS = {
+    "jaccard": Contingency.jaccard,
+    "nmi": Contingency.nmi,
+    "rand": Contingency.rand,
+    "adjusted_rand": Contingency.adjusted_rand,
+    "purity": Contingency.purity,
+    "f_measure": Contingency.f_measure,
+}
+
+
+class ClusteringEvaluator:
+    """Scores clusterings against one ground truth.
+
+    The partition sizes and entropy of the ground truth are computed once, every clustering builds its contingency
+    table once and all the requested metrics are derived from it.
+
+    Args:
+      true_labels: list of true cluster labels
+    """
+
+    def __init__(self, true_labels: List[int]):
+        self.true_labels = true_labels
+        self.gs = dict(Counter(true_labels))
+        self.h_g = entropy(self.gs, len(true_labels))
+
+    def contingency(self, pred_labels: List[int]) -> Contingency:
+        if len(pred_labels) != len(self.true_labels):
+            raise ValueError(
+                f"{len(pred_labels)} predicted labels for {len(self.true_labels)} true labels"
+            )
+        matrix = dict(Counter(zip(self.true_labels, pred_labels)))
+        return Contingency(matrix, self.gs, self.h_g)
+
+    def evaluate(
+        self, pred_labels: List[int], metrics: Iterable[str] = METRICS
+    ) -> Dict[str, float]:
+        """Score one clustering.
+        Args:
+          pred_labels: list of predicted cluster labels
+          metrics: the names of the metrics to compute, all of METRICS by default
+        Returns:
+          A dictionary of metric name: value
+        """
+        contingency = self.contingency(pred_labels)
+        return {metric: METRICS[metric](contingency) for metric in metrics}
+
+    def evaluate_many(
+        self, predictions: Iterable[List[int]], metrics: Iterable[str] = METRICS
+    ) -> List[Dict[str, float]]:
+        metrics = list(metrics)
+        return [self.evaluate(pred_labels, metrics) for pred_labels in predictions]
+
+
+class ContingencyAccumulator:
+    """A confusion matrix built from a stream of label chunks.
+
+    Every chunk updates the sparse counts in place, so the labels never need to be in memory at once, and the metrics
+    can be read at any point from the counts alone. Accumulators of different shards of the labels (e.g. in worker
+    processes) merge into the accumulator of the shards in order, and read exactly as if the labels had been
+    evaluated in one piece.
+    """
+
+    def __init__(self):
+        self.matrix: Counter = Counter()
+
+    def update(
+        self, true_labels: Iterable[int], pred_labels: Iterable[int]
+    ) -> "ContingencyAccumulator":
+        true_labels, pred_labels = list(true_labels), list(pred_labels)
+        if len(true_labels) != len(pred_labels):
+            raise ValueError(
+                f"{len(pred_labels)} predicted labels for {len(true_labels)} true labels"
+            )
+        self.matrix.update(zip(true_labels, pred_labels))
+        return self
+
+    def consume(
+        self, chunks: Iterable[Tuple[Iterable[int], Iterable[int]]]
+    ) -> "ContingencyAccumulator":
+        """Add (true_labels, pred_labels) chunks until the iterator is exhausted."""
+        for true_labels, pred_labels in chunks:
+            self.update(true_labels, pred_labels)
+        return self
+
+    def merge(self, other: "ContingencyAccumulator") -> "ContingencyAccumulator":
+        """Add the counts of an accumulator of the labels following the ones of this accumulator."""
+        self.matrix.update(other.matrix)
+        return self
+
+    def contingency(self) -> Contingency:
+        return Contingency(dict(self.matrix))
+
+    def jaccard(self) -> float:
+        return self.contingency().jaccard()
+
+    def nmi(self) -> float:
+        return self.contingency().nmi()
+
+
+def entropy(clusters: Dict[int, int], total_data: int) -> float:
+    return -sum(
+        p * math.log(p) for v in clusters.values() if (p := v / total_data) != 0
+    )
+
+
+def pairs(n: int) -> int:
+    # the number of unordered pairs among n points
+    return n * (n - 1) // 2
+
 
 #
 # class Method(Enum):
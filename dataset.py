@@ -0,0 +1,208 @@
+"""
+Compact datasets for the algorithms of this repository, read in bulk from their text formats.
+
+A numeric dataset is stored column-major: one array("d") (or array("q") for integer data) per column plus an optional
+array of labels, instead of a list or tuple of boxed floats per row. Text files are read in blocks of lines that are
+split and converted a column at a time. A dataset can be saved as a model_io file; loading it maps the file and hands
+out its columns as memoryviews, so a cached dataset is neither parsed nor copied:
+
+    points = dataset.load("test.txt", cache_path="test.cache", delimiter=",")
+
+Datasets behave as sequences of row tuples, so every algorithm taking rows accepts them, and the ones that work on
+columns (decision_tree, naive_bayes) use the columns as they are. hierarchical-clustering is the exception: it copies a
+dataset into row tuples once per dendrogram, as its n^2 distances each read two whole points.
+"""
+
+import os
+from array import array
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import model_io
+
+# the size of the blocks of lines parsed at once
+BLOCK_BYTES = 1 << 20
+
+Column = array | memoryview
+
+
+class Dataset:
+    """
+    Rows of numbers stored as columns.
+
+    Attributes:
+    - columns: The values of every feature, each an array or memoryview of the same length
+    - labels: The label of every row as an array or memoryview of integers, or None
+    - meta: The metadata saved with the dataset, if it was loaded from a file
+    """
+
+    def __init__(self, columns: List[Column], labels: Column | None = None):
+        self.columns = columns
+        self.labels = labels
+        self.meta: dict = {}
+
+    @classmethod
+    def from_rows(
+        cls,
+        rows: Sequence[Sequence[float]],
+        labels: Sequence[int] | None = None,
+        typecode: str = "d",
+    ) -> "Dataset":
+        columns = [array(typecode, column) for column in zip(*rows)]
+        return cls(columns, None if labels is None else array("q", labels))
+
+    @property
+    def n_features(self) -> int:
+        return len(self.columns)
+
+    def __len__(self) -> int:
+        if self.columns:
+            return len(self.columns[0])
+        return 0 if self.labels is None else len(self.labels)
+
+    def __getitem__(self, i: int) -> tuple:
+        return tuple(column[i] for column in self.columns)
+
+    def __iter__(self) -> Iterator[tuple]:
+        return zip(*self.columns)
+
+    def rows(self) -> List[tuple]:
+        return list(zip(*self.columns))
+
+    def save(self, path: str, meta: dict | None = None):
+        arrays = {f"column.{i}": column for i, column in enumerate(self.columns)}
+        if self.labels is not None:
+            arrays["labels"] = self.labels
+        model_io.save(
+            path, "dataset", arrays, {"n_features": self.n_features, **(meta or {})}
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "Dataset":
+        # the columns stay memory-mapped from the file
+        model = model_io.load(path, "dataset")
+        dataset = cls(
+            [model.arrays[f"column.{i}"] for i in range(model.meta["n_features"])],
+            model.arrays.get("labels"),
+        )
+        dataset.meta = model.meta
+        return dataset
+
+
+class Transactions:
+    """
+    Transactions of items, with every item interned to an integer id.
+
+    Attributes:
+    - names: The item of every id
+    - items: The item ids of all the transactions, one after the other
+    - offsets: Where every transaction starts in items, followed by the total number of items
+    """
+
+    def __init__(self, names: List[str], items: Column, offsets: Column):
+        self.names = names
+        self.items = items
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, t: int) -> Column:
+        return self.items[self.offsets[t] : self.offsets[t + 1]]
+
+
+def read_numeric(
+    path: str,
+    delimiter: str | None = None,
+    label_column: int | None = None,
+    typecode: str = "d",
+    skip: int = 0,
+) -> Dataset:
+    """
+    Read a file of numeric rows, one row per line.
+
+    Parameters:
+    path (str): The file to read.
+    delimiter (str | None): The separator of the values, e.g. ","; None splits on whitespace.
+    label_column (int | None): The column holding integer labels, if any, e.g. -1 for the last one.
+    typecode (str): The array type of the features, "d" for floats or "q" for integers.
+    skip (int): The number of header lines to skip.
+
+    Returns:
+    Dataset: The columns of the file, blank lines left out.
+    """
+    convert = float if typecode == "d" else int
+    columns: List[array] = []
+    labels = None if label_column is None else array("q")
+    width = None
+    with open(path) as file:
+        for _ in range(skip):
+            file.readline()
+        for block in iter(lambda: file.readlines(BLOCK_BYTES), []):
+            rows = [line.split(delimiter) for line in block if line.strip()]
+            if not rows:
+                continue
+            if width is None:
+                width = len(rows[0])
+                n_features = width if labels is None else width - 1
+                columns = [array(typecode) for _ in range(n_features)]
+            if any(len(row) != width for row in rows):
+                raise ValueError(f"{path} has rows of different lengths")
+
+            values = list(zip(*rows))
+            if labels is not None:
+                labels.extend(map(int, values.pop(label_column)))
+            for column, column_values in zip(columns, values):
+                column.extend(map(convert, column_values))
+    return Dataset(columns, labels)
+
+
+def read_label_pairs(path: str, skip: int = 0) -> Tuple[array, array]:
+    """
+    Read a file of "true_label pred_label" lines.
+
+    Returns:
+    Tuple[array, array]: The true and the predicted labels.
+    """
+    pairs = read_numeric(path, typecode="q", skip=skip)
+    if pairs.n_features != 2:
+        raise ValueError(f"{path} does not hold label pairs")
+    true_labels, pred_labels = pairs.columns
+    return true_labels, pred_labels
+
+
+def read_transactions(path: str, delimiter: str = ";") -> Transactions:
+    """
+    Read a file of transactions, one transaction of delimiter-separated items per line.
+    """
+    ids: Dict[str, int] = {}
+    items = array("l")
+    offsets = array("q", [0])
+    with open(path) as file:
+        for block in iter(lambda: file.readlines(BLOCK_BYTES), []):
+            for line in block:
+                line = line.rstrip("\n")
+                if line:
+                    items.extend(
+                        ids.setdefault(item, len(ids)) for item in line.split(delimiter)
+                    )
+                    offsets.append(len(items))
+    return Transactions(list(ids), items, offsets)
+
+
+def load(path: str, cache_path: str | None = None, **options) -> Dataset:
+    """
+    Read a file of numeric rows with read_numeric(), through a binary cache file if cache_path is given.
+
+    The cache is used when it is newer than the file and was written with the same options; otherwise the file is
+    read and the cache (re)written.
+    """
+    if cache_path is not None and os.path.exists(cache_path):
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            cached = Dataset.load(cache_path)
+            if cached.meta.get("options") == options:
+                return cached
+
+    dataset = read_numeric(path, **options)
+    if cache_path is not None:
+        dataset.save(cache_path, {"options": options})
+    return dataset
@@ -1,6 +1,38 @@
 import collections
-from typing import Counter, Dict, List, Tuple
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Counter,
+    Dict,
+    Iterable,
+    List,
+    Sequence,
+    Tuple,
+)
 import math
+import random
+import sys
+import time
+
+# the repository modules are imported where they are used, so this file also works on its own
+if TYPE_CHECKING:
+    from dataset import Dataset
+
+
+def is_dataset(data) -> bool:
+    # a Dataset exists only once dataset.py is imported, so this file does not need to import it
+    dataset = sys.modules.get("dataset")
+    return dataset is not None and isinstance(data, dataset.Dataset)
+
+
+def active_recorder():
+    # the enabled instrumentation recorder; instrumentation.py is not imported unless something enabled it
+    instrumentation = sys.modules.get("instrumentation")
+    return None if instrumentation is None else instrumentation.active
 
 
 class Node:
@@ -26,8 +58,649 @@ class Node:
         self.right: Node | None = None
 
 
+class SplitEngine:
+    """
+    Exact split search over presorted feature columns.
+
+    Every feature column is sorted once when the tree is fitted. A node is then described by the ids of the rows
+    reaching it plus, for every feature, those ids ordered by the feature's value; partitioning a node keeps all of
+    these orders, so no node ever sorts again. Candidate midpoints are evaluated by sweeping the sorted rows with
+    running class counts, which makes a feature cost O(n) per node instead of one full rescan per midpoint.
+
+    The gains are computed with the same arithmetic as Solution.split_info (class counts are passed to info in order
+    of first appearance among the rows of each side), so the chosen split, including tie-breaking, is identical to
+    evaluating split_info for every midpoint.
+    """
+
+    def __init__(
+        self,
+        columns: List[Sequence[float]],
+        labels: Sequence[int],
+        info: Callable[[List[int], int], float],
+        min_samples_leaf: int = 1,
+    ):
+        self.columns = columns
+        self.labels = labels
+        self.info = info
+        self.min_samples_leaf = min_samples_leaf
+        self.goes_left = bytearray(len(labels))
+        self.recorder = active_recorder()
+        # every feature's order of all the training rows, once a sample has needed it
+        self.presorted: List[Sequence[int]] | None = None
+
+    def root(
+        self, rows: Iterable[int] | None = None
+    ) -> Tuple[List[int], List[List[int]]]:
+        """
+        Return the rows and per-feature orders of the root node: the whole training set, or a sample of its row ids
+        where a row may appear several times (e.g. a bootstrap sample). The orders of a sample are filtered from
+        the presorted orders of the whole training set instead of being sorted again.
+        """
+        n = len(self.labels)
+        if rows is None:
+            rows = list(range(n))
+            return rows, [
+                sorted(rows, key=column.__getitem__) for column in self.columns
+            ]
+
+        rows = sorted(rows)
+        if self.presorted is None:
+            self.presorted = [
+                sorted(range(n), key=column.__getitem__) for column in self.columns
+            ]
+        multiplicity = [0] * n
+        for r in rows:
+            multiplicity[r] += 1
+        return rows, [
+            [r for r in order for _ in range(multiplicity[r])]
+            for order in self.presorted
+        ]
+
+    def find_split(
+        self,
+        order: List[List[int]],
+        base_info: float,
+        features: Sequence[int] | None = None,
+    ) -> Tuple[float, int, float]:
+        """
+        Find the best split of a node over all features, or over the given ascending subset of them.
+
+        Parameters:
+        order (List[List[int]]): For every feature, the ids of the node's rows sorted by that feature's value.
+        base_info (float): The Info of the node before splitting.
+        features (Sequence[int] | None): The features to consider, all of them if None.
+
+        Returns:
+        Tuple[float, int, float]: The best gain, its split_dim and split_point. Ties go to the smaller dimension,
+        then to the smaller midpoint. If no feature can be split, the gain is -inf and the split is (0, 0.0).
+        """
+        max_gain = float("-inf")
+        max_dim_split = (0, 0.0)
+        for i in range(len(order)) if features is None else features:
+            cur_best_gain, cur_best_mid = self.best_split(i, order[i], base_info)
+            if cur_best_gain > max_gain:
+                max_gain, max_dim_split = cur_best_gain, (i, cur_best_mid)
+        return max_gain, *max_dim_split
+
+    def best_split(
+        self, split_dim: int, order: List[int], base_info: float
+    ) -> Tuple[float, float]:
+        """
+        Find the best midpoint of a single feature.
+
+        Parameters:
+        split_dim (int): The feature to split on.
+        order (List[int]): The ids of the node's rows sorted by the feature's value.
+        base_info (float): The Info of the node before splitting.
+
+        Returns:
+        Tuple[float, float]: The best gain and its midpoint, the smaller midpoint winning ties.
+        (-inf, 0) if no midpoint leaves min_samples_leaf rows on both sides.
+        """
+        column = self.columns[split_dim]
+        min_leaf = self.min_samples_leaf
+
+        # group the sorted rows into runs of equal value
+        vals, bounds = [], []
+        for k, r in enumerate(order):
+            if not vals or column[r] != vals[-1]:
+                vals.append(column[r])
+                bounds.append(k)
+        bounds.append(len(order))
+
+        # Info of the rows left of each cut, and of the rows right of it
+        n_runs = len(vals)
+        left_infos = self.cumulative_infos(order, bounds, range(n_runs))
+        right_infos = self.cumulative_infos(order, bounds, range(n_runs - 1, -1, -1))
+
+        N = len(order)
+        cur_best_gain = float("-inf")
+        cur_best_mid = 0
+        cut = 0
+        for a, b in zip(vals, vals[1:]):
+            m = (a + b) / 2
+
+            # the cut puts every run with a value <= m on the left
+            while cut < n_runs and vals[cut] <= m:
+                cut += 1
+            left_N = bounds[cut]
+            right_N = N - left_N
+            if left_N < min_leaf or right_N < min_leaf:
+                continue
+
+            info_A = 0.0
+            if left_N > 0:
+                info_A += left_N / N * left_infos[cut]
+            if right_N > 0:
+                info_A += right_N / N * right_infos[n_runs - cut]
+            gain = base_info - info_A
+            if gain > cur_best_gain:
+                cur_best_gain, cur_best_mid = gain, m
+
+        if self.recorder is not None:
+            self.recorder.count("tree.candidate_splits", n_runs - 1)
+        return cur_best_gain, cur_best_mid
+
+    def cumulative_infos(
+        self, order: List[int], bounds: List[int], runs: Iterable[int]
+    ) -> List[float]:
+        """
+        Sweep the given runs of a sorted node and return the Info of the rows swept so far after each run,
+        starting with 0.0 for no rows.
+        """
+        labels = self.labels
+        counts: Dict[int, int] = {}
+        first: Dict[int, int] = {}
+        classes: List[int] = []
+        reorder = False
+        infos = [0.0]
+        n = 0
+        for run in runs:
+            for k in range(bounds[run], bounds[run + 1]):
+                r = order[k]
+                y = labels[r]
+                if y in counts:
+                    counts[y] += 1
+                    if r < first[y]:
+                        first[y] = r
+                        reorder = True
+                else:
+                    counts[y] = 1
+                    first[y] = r
+                    reorder = True
+            n += bounds[run + 1] - bounds[run]
+
+            # split_info counts labels in order of first appearance
+            if reorder:
+                classes = sorted(first, key=first.__getitem__)
+                reorder = False
+            infos.append(self.info([counts[y] for y in classes], n))
+        return infos
+
+    def partition(
+        self,
+        rows: List[int],
+        order: List[List[int]],
+        split_dim: int,
+        split_point: float,
+    ) -> Tuple[Tuple[List[int], List[List[int]]], Tuple[List[int], List[List[int]]]]:
+        """
+        Split a node's rows and per-feature orders into those of its left (<= split_point) and right children.
+        Both children keep their rows ascending and every feature order sorted.
+        """
+        column = self.columns[split_dim]
+        # sibling subtrees may be partitioned concurrently, but they write disjoint rows
+        goes_left = self.goes_left
+        for r in rows:
+            goes_left[r] = column[r] <= split_point
+
+        left_rows = [r for r in rows if goes_left[r]]
+        right_rows = [r for r in rows if not goes_left[r]]
+        left_order = [[r for r in o if goes_left[r]] for o in order]
+        right_order = [[r for r in o if not goes_left[r]] for o in order]
+        return (left_rows, left_order), (right_rows, right_order)
+
+    def close(self):
+        """
+        Release the resources held by the engine once the tree is built.
+        """
+
+
+class ParallelSplitEngine(SplitEngine):
+    """
+    A SplitEngine that evaluates the features of large nodes across a process pool.
+
+    The training columns and labels live in one shared memory block that every worker attaches to once, and the
+    per-feature orders of a node are published in a shared block of their own, so a task only carries a block name,
+    a feature and a few numbers. Results are reduced in feature order with the serial comparison, so the chosen split
+    is the same as SplitEngine's bit for bit. Nodes with fewer than min_rows rows are searched serially.
+    """
+
+    def __init__(
+        self,
+        columns: List[Sequence[float]],
+        labels: Sequence[int],
+        info: Callable[[List[int], int], float],
+        min_samples_leaf: int,
+        n_jobs: int,
+        min_rows: int,
+    ):
+        n, d = len(labels), len(columns)
+        self.shared = shared_memory.SharedMemory(
+            create=True, size=max(1, 8 * n * (d + 1))
+        )
+        shared_columns, shared_labels = shared_views(self.shared, n, d)
+        for i, column in enumerate(columns):
+            shared_columns[i * n : (i + 1) * n] = array("d", column)
+        shared_labels[:] = array("q", labels)
+
+        # the parent reads the shared copy as well, so serial and parallel searches see the same values
+        super().__init__(
+            [shared_columns[i * n : (i + 1) * n] for i in range(d)],
+            shared_labels,
+            info,
+            min_samples_leaf,
+        )
+        self.min_rows = min_rows
+        self.pool = ProcessPoolExecutor(
+            n_jobs,
+            initializer=attach_shared_engine,
+            initargs=(self.shared.name, n, d, min_samples_leaf),
+        )
+
+    def find_split(
+        self,
+        order: List[List[int]],
+        base_info: float,
+        features: Sequence[int] | None = None,
+    ) -> Tuple[float, int, float]:
+        m = len(order[0]) if order else 0
+        if m < self.min_rows:
+            return super().find_split(order, base_info, features)
+        if features is None:
+            features = range(len(order))
+
+        block = shared_memory.SharedMemory(create=True, size=8 * m * len(order))
+        try:
+            with block.buf.cast("q") as orders:
+                for i, feature_order in enumerate(order):
+                    orders[i * m : (i + 1) * m] = array("q", feature_order)
+            futures = [
+                self.pool.submit(shared_best_split, block.name, m, i, base_info)
+                for i in features
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            block.close()
+            block.unlink()
+
+        max_gain = float("-inf")
+        max_dim_split = (0, 0.0)
+        for i, (cur_best_gain, cur_best_mid) in zip(features, results):
+            if cur_best_gain > max_gain:
+                max_gain, max_dim_split = cur_best_gain, (i, cur_best_mid)
+        return max_gain, *max_dim_split
+
+    def close(self):
+        self.pool.shutdown()
+        for column in self.columns:
+            column.release()
+        self.labels.release()
+        self.columns, self.labels = [], []
+        self.shared.close()
+        self.shared.unlink()
+
+
+def shared_views(
+    shared: shared_memory.SharedMemory, n: int, d: int
+) -> Tuple[memoryview, memoryview]:
+    """
+    Return the column-major feature values (n * d doubles) and the labels (n int64) stored in a shared block.
+    """
+    return (
+        shared.buf[: 8 * n * d].cast("d"),
+        shared.buf[8 * n * d : 8 * n * (d + 1)].cast("q"),
+    )
+
+
+# the engine of a pool worker, attached to the parent's shared columns
+_shared_engine: SplitEngine | None = None
+
+
+def attach_shared_engine(name: str, n: int, d: int, min_samples_leaf: int):
+    """
+    Pool initializer: attach to the shared training columns and build this worker's SplitEngine over them.
+    """
+    global _shared_engine
+    _shared_engine = shared_engine(name, n, d, min_samples_leaf)
+
+
+def shared_engine(name: str, n: int, d: int, min_samples_leaf: int) -> SplitEngine:
+    """
+    Build a SplitEngine over the training columns and labels of a shared block laid out as by shared_views(), for a
+    pool worker. The block stays mapped for the lifetime of the engine, as engine.shared.
+    """
+    shared = shared_memory.SharedMemory(name=name)
+    columns, labels = shared_views(shared, n, d)
+    engine = SplitEngine(
+        [columns[i * n : (i + 1) * n] for i in range(d)],
+        labels,
+        Solution().info,
+        min_samples_leaf,
+    )
+    engine.shared = shared
+    # a recorder inherited from the parent could not report back
+    engine.recorder = None
+    return engine
+
+
+def shared_best_split(
+    name: str, m: int, split_dim: int, base_info: float
+) -> Tuple[float, float]:
+    """
+    Pool task: find the best midpoint of one feature of a node whose orders are published in a shared block.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        with block.buf.cast("q") as orders:
+            with orders[split_dim * m : (split_dim + 1) * m] as order:
+                return _shared_engine.best_split(split_dim, order, base_info)
+    finally:
+        block.close()
+
+
+class HistogramSplitEngine:
+    """
+    Approximate split search over binned feature columns (histogram mode).
+
+    Every feature is quantized once into at most max_bins bins of consecutive values, each bin holding whole runs of
+    equal values and about the same number of rows. A node is then described by its rows plus, for every feature,
+    its class counts per bin, and a feature's split is found by sweeping the bin boundaries with running class
+    counts, which costs O(bins * classes) per node however many distinct values the feature has. Only the smaller
+    child's histograms are counted from its rows; the larger child's are its parent's minus its sibling's.
+
+    The threshold after a bin is the midpoint between the largest training value in it and the smallest one in the
+    next bin, over the whole training set, so split_point is a real value and traversal is unchanged. A feature with
+    at most max_bins distinct values keeps one bin per value, so every candidate split of a node separates its rows
+    as an exact one does, but split_point is the midpoint between adjacent values of the whole training set, not of
+    the node's rows: it differs from the exact split_point wherever the node lacks some values, and ties between
+    equal gains, broken by split_point, can then pick a different split and grow a different tree.
+    """
+
+    def __init__(
+        self,
+        columns: List[Sequence[float]],
+        labels: Sequence[int],
+        info: Callable[[List[int], int], float],
+        min_samples_leaf: int = 1,
+        max_bins: int = 255,
+    ):
+        self.columns = columns
+        self.labels = labels
+        self.info = info
+        self.min_samples_leaf = min_samples_leaf
+        self.recorder = active_recorder()
+
+        class_ids = {label: c for c, label in enumerate(sorted(set(labels)))}
+        self.n_classes = len(class_ids)
+        self.classes = array("q", (class_ids[label] for label in labels))
+        self.bins, self.thresholds = [], []
+        for column in columns:
+            bins, thresholds = quantize(column, max_bins)
+            self.bins.append(bins)
+            self.thresholds.append(thresholds)
+
+    def root(self, rows: Iterable[int] | None = None) -> Tuple[List[int], List[array]]:
+        """
+        Return the rows and per-feature histograms of the root node: the whole training set, or a sample of its row
+        ids where a row may appear several times.
+        """
+        rows = list(range(len(self.labels))) if rows is None else sorted(rows)
+        return rows, self.histograms(rows)
+
+    def histograms(self, rows: List[int]) -> List[array]:
+        """
+        Count the rows per feature, bin and class: entry bin * n_classes + class of every feature's histogram.
+        """
+        n_classes, classes = self.n_classes, self.classes
+        histograms = []
+        for bins, thresholds in zip(self.bins, self.thresholds):
+            histogram = array("q", bytes(8 * (len(thresholds) + 1) * n_classes))
+            for r in rows:
+                histogram[bins[r] * n_classes + classes[r]] += 1
+            histograms.append(histogram)
+        return histograms
+
+    def find_split(
+        self,
+        histograms: List[array],
+        base_info: float,
+        features: Sequence[int] | None = None,
+    ) -> Tuple[float, int, float]:
+        """
+        Find the best split of a node over all features, or over the given ascending subset of them, with the same
+        tie-breaking as SplitEngine.find_split.
+        """
+        max_gain = float("-inf")
+        max_dim_split = (0, 0.0)
+        for i in range(len(histograms)) if features is None else features:
+            cur_best_gain, cur_best_mid = self.best_split(i, histograms[i], base_info)
+            if cur_best_gain > max_gain:
+                max_gain, max_dim_split = cur_best_gain, (i, cur_best_mid)
+        return max_gain, *max_dim_split
+
+    def best_split(
+        self, split_dim: int, histogram: array, base_info: float
+    ) -> Tuple[float, float]:
+        """
+        Find the best bin boundary of a single feature, the smaller threshold winning ties.
+        (-inf, 0) if no boundary leaves min_samples_leaf rows on both sides.
+        """
+        n_classes = self.n_classes
+        min_leaf = self.min_samples_leaf
+        totals = [sum(histogram[c::n_classes]) for c in range(n_classes)]
+        N = sum(totals)
+
+        left = [0] * n_classes
+        left_N = 0
+        cur_best_gain = float("-inf")
+        cur_best_mid = 0
+        candidates = 0
+        for b, threshold in enumerate(self.thresholds[split_dim]):
+            counts = histogram[b * n_classes : (b + 1) * n_classes]
+            bin_N = sum(counts)
+            if not bin_N:
+                # the same partition as the previous boundary
+                continue
+            left = [*map(int.__add__, left, counts)]
+            left_N += bin_N
+            right_N = N - left_N
+            if right_N == 0:
+                break
+            if left_N < min_leaf or right_N < min_leaf:
+                continue
+
+            candidates += 1
+            right = [*map(int.__sub__, totals, left)]
+            info_A = left_N / N * self.info(left, left_N)
+            info_A += right_N / N * self.info(right, right_N)
+            gain = base_info - info_A
+            if gain > cur_best_gain:
+                cur_best_gain, cur_best_mid = gain, threshold
+
+        if self.recorder is not None:
+            self.recorder.count("tree.candidate_splits", candidates)
+        return cur_best_gain, cur_best_mid
+
+    def partition(
+        self,
+        rows: List[int],
+        histograms: List[array],
+        split_dim: int,
+        split_point: float,
+    ) -> Tuple[Tuple[List[int], List[array]], Tuple[List[int], List[array]]]:
+        """
+        Split a node's rows into those of its left (<= split_point) and right children, counting the histograms of
+        the smaller child and subtracting them from the node's for the larger one.
+        """
+        column = self.columns[split_dim]
+        left_rows = [r for r in rows if column[r] <= split_point]
+        right_rows = [r for r in rows if column[r] > split_point]
+
+        small_rows = left_rows if len(left_rows) <= len(right_rows) else right_rows
+        small = self.histograms(small_rows)
+        large = [
+            array("q", map(int.__sub__, parent, sibling))
+            for parent, sibling in zip(histograms, small)
+        ]
+        if small_rows is left_rows:
+            return (left_rows, small), (right_rows, large)
+        return (left_rows, large), (right_rows, small)
+
+    def close(self):
+        """
+        Release the resources held by the engine.
+        """
+
+
+def quantize(column: Sequence[float], max_bins: int) -> Tuple[array, array]:
+    """
+    Bin the values of a column into at most max_bins bins of consecutive values, each bin holding whole runs of equal
+    values and the bins holding about the same number of rows.
+
+    Returns:
+    Tuple[array, array]: The bin of every row, and the threshold between every bin and the next one.
+    """
+    counts = collections.Counter(column)
+    values = sorted(counts)
+    if len(values) <= max_bins:
+        value_bins = list(range(len(values)))
+    else:
+        # a value goes to the bin its first row falls in when the rows are cut into max_bins equal parts
+        n = len(column)
+        raw, before = [], 0
+        for value in values:
+            raw.append(before * max_bins // n)
+            before += counts[value]
+        ids = {bin_id: i for i, bin_id in enumerate(sorted(set(raw)))}
+        value_bins = [ids[bin_id] for bin_id in raw]
+
+    lows: Dict[int, float] = {}
+    highs: Dict[int, float] = {}
+    for value, bin_id in zip(values, value_bins):
+        lows.setdefault(bin_id, value)
+        highs[bin_id] = value
+
+    thresholds = array("d")
+    for b in range(len(lows) - 1):
+        mid = (highs[b] + lows[b + 1]) / 2
+        # between two adjacent floats the midpoint may round up to the larger one
+        thresholds.append(mid if mid < lows[b + 1] else highs[b])
+
+    value_bin = dict(zip(values, value_bins))
+    return array("l", map(value_bin.__getitem__, column)), thresholds
+
+
+class FlatTree:
+    """
+    A fitted decision tree compiled into flat parallel arrays, one entry per node in breadth-first order with the
+    root at index 0. Leaves have split_dim -1 and no children (left and right are -1).
+
+    Predicting routes the whole batch one level at a time: every node partitions the ids of the rows that reached it
+    between its two children, so node parameters are read once per node rather than once per row.
+    """
+
+    def __init__(
+        self,
+        split_dim: Sequence[int],
+        split_point: Sequence[float],
+        left: Sequence[int],
+        right: Sequence[int],
+        label: Sequence[int],
+    ):
+        self.split_dim = split_dim
+        self.split_point = split_point
+        self.left = left
+        self.right = right
+        self.label = label
+
+    @classmethod
+    def from_node(cls, root: Node) -> "FlatTree":
+        """
+        Compile the tree rooted at the given Node.
+        """
+        nodes = [root]
+        for node in nodes:
+            if node.left and node.right:
+                nodes.append(node.left)
+                nodes.append(node.right)
+        index = {id(node): i for i, node in enumerate(nodes)}
+
+        tree = cls(array("q"), array("d"), array("q"), array("q"), array("q"))
+        for node in nodes:
+            is_leaf = not (node.left and node.right)
+            tree.split_dim.append(-1 if is_leaf else node.split_dim)
+            tree.split_point.append(node.split_point)
+            tree.left.append(-1 if is_leaf else index[id(node.left)])
+            tree.right.append(-1 if is_leaf else index[id(node.right)])
+            tree.label.append(node.label)
+        return tree
+
+    def predict(self, data: List[List[float]]) -> List[int]:
+        """
+        Predict the label of every datapoint in data, a list of rows or a Dataset.
+        """
+        columns = data.columns if is_dataset(data) else None
+        predictions = [0] * len(data)
+        frontier = [(0, range(len(data)))]
+        while frontier:
+            next_frontier = []
+            for n, rows in frontier:
+                split_dim = self.split_dim[n]
+                if split_dim < 0:
+                    label = self.label[n]
+                    for r in rows:
+                        predictions[r] = label
+                    continue
+
+                split_point = self.split_point[n]
+                if columns is not None:
+                    column = columns[split_dim]
+                    goes_left = (column[r] <= split_point for r in rows)
+                else:
+                    goes_left = (data[r][split_dim] <= split_point for r in rows)
+                left_rows, right_rows = array("q"), array("q")
+                for r, left in zip(rows, goes_left):
+                    if left:
+                        left_rows.append(r)
+                    else:
+                        right_rows.append(r)
+                if left_rows:
+                    next_frontier.append((self.left[n], left_rows))
+                if right_rows:
+                    next_frontier.append((self.right[n], right_rows))
+            frontier = next_frontier
+        return predictions
+
+
 class Solution:
     """
+    Parameters:
+    max_depth (int | None): Nodes at this depth become leaves (the root is at depth 0). None grows the tree until
+    the leaves are pure or cannot be split.
+    min_samples_leaf (int): The minimum number of training rows on each side of a split.
+    min_gain (float | None): Nodes whose best split gains less than this become leaves. None accepts any split.
+    n_jobs (int | None): The number of worker processes evaluating the features of large nodes, -1 for one per CPU.
+    None or 1 builds the tree in this process.
+    parallel_min_rows (int): With n_jobs, nodes with at least this many rows have their features evaluated in the
+    pool and their two subtrees built concurrently.
+    max_bins (int | None): Find splits over at most this many bins per feature (HistogramSplitEngine) instead of
+    every midpoint. The features are then evaluated in this process.
+    max_features (int | None): Search every node's split over this many randomly drawn features. None searches all
+    of them.
+    seed (int | None): Seeds the feature draws. Every node draws from its own generator, derived from its parent's,
+    so a tree does not depend on the order its nodes are built in.
+
     Example usage of the Node class to build a decision tree using a custom method called split_node():
 
     # In the fit method, create the root node and call the split_node() method to build the decision tree
@@ -53,56 +726,137 @@ class Solution:
             split_node(right_child, right_data, ..., depth+1)
     """
 
+    def __init__(
+        self,
+        max_depth: int | None = 2,
+        min_samples_leaf: int = 1,
+        min_gain: float | None = None,
+        n_jobs: int | None = None,
+        parallel_min_rows: int = 10000,
+        max_bins: int | None = None,
+        max_features: int | None = None,
+        seed: int | None = None,
+    ):
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.min_gain = min_gain
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.parallel_min_rows = parallel_min_rows
+        self.max_bins = max_bins
+        self.max_features = max_features
+        self.seed = seed
+
     def split_node(
-        self, node: Node, data: List[List[float]], labels: List[int], depth: int
+        self,
+        node: Node,
+        engine: SplitEngine,
+        rows: List[int],
+        order: List[List[int]],
+        depth: int,
+        rng: random.Random | None = None,
     ):
+        """
+        Recursively build the subtree rooted at node from the training rows that reach it.
+
+        Parameters:
+        node (Node): The node to fill in.
+        engine (SplitEngine): The split engine holding the presorted (or binned) training columns.
+        rows (List[int]): Ids of the training rows reaching this node, in ascending order.
+        order (List[List[int]]): For every feature, the same row ids sorted by that feature's value (the node's
+        histograms with a HistogramSplitEngine).
+        depth (int): The depth of node, the root being at depth 0.
+        rng (random.Random | None): Draws the max_features features searched at this node. Required if
+        max_features is set.
+        """
+        features = None
+        if self.max_features is not None and self.max_features < len(order):
+            features = sorted(rng.sample(range(len(order)), self.max_features))
+
+        recorder = engine.recorder
+        if recorder is None:
+            children = self.build_node(node, engine, rows, order, depth, features)
+        else:
+            start = time.perf_counter()
+            children = self.build_node(node, engine, rows, order, depth, features)
+            seconds = time.perf_counter() - start
+            recorder.count("tree.nodes")
+            recorder.add_time(f"tree.depth.{depth}.seconds", seconds)
+            recorder.emit(
+                "tree.node",
+                depth=depth,
+                rows=len(rows),
+                leaf=children is None,
+                seconds=seconds,
+            )
+        if children is None:
+            return
+        left, right = children
+        # the children draw from their own generators, whichever of them is built first
+        left_rng = right_rng = None
+        if rng is not None:
+            left_rng = random.Random(rng.getrandbits(64))
+            right_rng = random.Random(rng.getrandbits(64))
+
+        # go to next level, building large siblings concurrently
+        node.left, node.right = Node(), Node()
+        if self.is_parallel() and len(rows) >= self.parallel_min_rows:
+            with ThreadPoolExecutor(1) as executor:
+                future = executor.submit(
+                    self.split_node, node.left, engine, *left, depth + 1, left_rng
+                )
+                self.split_node(node.right, engine, *right, depth + 1, right_rng)
+                future.result()
+        else:
+            self.split_node(node.left, engine, *left, depth + 1, left_rng)
+            self.split_node(node.right, engine, *right, depth + 1, right_rng)
+
+    def build_node(
+        self,
+        node: Node,
+        engine: SplitEngine,
+        rows: List[int],
+        order: List[List[int]],
+        depth: int,
+        features: Sequence[int] | None = None,
+    ) -> (
+        Tuple[Tuple[List[int], List[List[int]]], Tuple[List[int], List[List[int]]]]
+        | None
+    ):
+        """
+        Label a node and choose its split over the given features (all of them if None), without building its
+        children.
+
+        Returns:
+        The rows and orders of the left and right children, or None if the node is a leaf.
+        """
         # assign max label
-        label_counts = collections.Counter(labels)
+        label_counts = collections.Counter(engine.labels[r] for r in rows)
         node.label = min(
             k for k, v in label_counts.items() if v == max(label_counts.values())
         )
 
         # check if the node is leaf
-        if len(data) == 0 or depth == 2 or len(label_counts) == 1:
-            return
+        if (
+            len(rows) == 0
+            or (self.max_depth is not None and depth >= self.max_depth)
+            or len(rows) < 2 * self.min_samples_leaf
+            or len(label_counts) == 1
+        ):
+            return None
 
         # compute base entropy
-        base_info = self.info([*label_counts.values()], len(labels))
-
-        # search for best split and dim
-        max_gain = float("-inf")
-        max_dim_split = (0, 0.0)
-        for i in range(len(data[0])):
-            attr_vals = sorted(set(row[i] for row in data))
-            midpoints = [(a + b) / 2 for a, b in zip(attr_vals, attr_vals[1:])]
-
-            cur_best_gain = float("-inf")
-            cur_best_mid = 0
-            for m in midpoints:
-                info_A = self.split_info(data, labels, i, m)
-                gain = base_info - info_A
-                if gain > cur_best_gain:
-                    cur_best_gain, cur_best_mid = gain, m
+        base_info = self.info([*label_counts.values()], len(rows))
 
-            if cur_best_gain > max_gain:
-                max_gain, max_dim_split = cur_best_gain, (i, cur_best_mid)
-
-        node.split_dim, node.split_point = max_dim_split
+        # search for best split and dim, the node stays a leaf if no split is good enough
+        gain, split_dim, split_point = engine.find_split(order, base_info, features)
+        if gain == float("-inf") or (
+            self.min_gain is not None and gain < self.min_gain
+        ):
+            return None
+        node.split_dim, node.split_point = split_dim, split_point
 
         # partition data
-        left_data, left_labels, right_data, right_labels = [], [], [], []
-        for x, y in zip(data, labels):
-            if x[node.split_dim] <= node.split_point:
-                left_data.append(x)
-                left_labels.append(y)
-            else:
-                right_data.append(x)
-                right_labels.append(y)
-
-        # go to next level
-        node.left, node.right = Node(), Node()
-        self.split_node(node.left, left_data, left_labels, depth + 1)
-        self.split_node(node.right, right_data, right_labels, depth + 1)
+        return engine.partition(rows, order, node.split_dim, node.split_point)
 
     def info(self, train_label_counts: List[int], num_data: int):
         return -sum(
@@ -159,7 +913,11 @@ class Solution:
 
         return info_A
 
-    def fit(self, train_data: List[List[float]], train_label: List[int]) -> None:
+    def fit(
+        self,
+        train_data: "List[List[float]] | Dataset",
+        train_label: List[int] | None = None,
+    ) -> None:
         """
         Fit the decision tree model using the provided training data and labels.
 
@@ -177,9 +935,48 @@ class Solution:
         So it is very important to ensure that self.root is assigned correctly to the root node
 
         It is best to use a different method (such as in the example above) to build the decision tree.
+
+        train_data may also be a Dataset, whose columns are used as they are and whose labels are used if train_label
+        is None.
         """
+        if is_dataset(train_data):
+            columns = train_data.columns
+            if train_label is None:
+                train_label = train_data.labels
+        else:
+            columns = [
+                [row[i] for row in train_data] for i in range(len(train_data[0]))
+            ]
+        if self.max_bins is not None:
+            engine = HistogramSplitEngine(
+                columns,
+                train_label,
+                self.info,
+                self.min_samples_leaf,
+                self.max_bins,
+            )
+        elif self.is_parallel():
+            engine = ParallelSplitEngine(
+                columns,
+                train_label,
+                self.info,
+                self.min_samples_leaf,
+                self.n_jobs,
+                self.parallel_min_rows,
+            )
+        else:
+            engine = SplitEngine(columns, train_label, self.info, self.min_samples_leaf)
+
+        rng = None if self.max_features is None else random.Random(self.seed)
         self.root = Node()
-        self.split_node(self.root, train_data, train_label, depth=0)
+        try:
+            self.split_node(self.root, engine, *engine.root(), depth=0, rng=rng)
+        finally:
+            engine.close()
+        self.tree = FlatTree.from_node(self.root)
+
+    def is_parallel(self) -> bool:
+        return self.n_jobs is not None and self.n_jobs > 1
 
     def classify(
         self,
@@ -202,16 +999,59 @@ class Solution:
                    the train data and labels to a decision tree.
         """
         self.fit(train_data, train_label)
+        return self.predict_batch(test_data)
 
-        def traverse(node: Node, datapoint: List[float]):
-            while node.left and node.right:
-                if datapoint[node.split_dim] <= node.split_point:
-                    node = node.left
-                else:
-                    node = node.right
-            return node.label
+    def predict_batch(self, test_data: List[List[float]]) -> List[int]:
+        """
+        Predict the labels of the test data with the tree built by the last call to 'fit()'.
+
+        Parameters:
+        test_data (List[List[float]]): A nested list of floating point numbers representing the test data.
+
+        Returns:
+        List[int]: A list of integer predictions, one for each datapoint in the test data.
+        """
+        return self.tree.predict(test_data)
+
+    def save(self, path: str):
+        """
+        Save the fitted tree's flat arrays and parameters to a model file.
+        """
+        import model_io
+
+        tree = self.tree
+        model_io.save(
+            path,
+            "decision_tree",
+            {
+                "split_dim": tree.split_dim,
+                "split_point": tree.split_point,
+                "left": tree.left,
+                "right": tree.right,
+                "label": tree.label,
+            },
+            {
+                "max_depth": self.max_depth,
+                "min_samples_leaf": self.min_samples_leaf,
+                "min_gain": self.min_gain,
+                "max_bins": self.max_bins,
+                "max_features": self.max_features,
+                "seed": self.seed,
+            },
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "Solution":
+        """
+        Load a tree saved by 'save()'. Its arrays stay memory-mapped and shared with every other process loading the
+        same file; the loaded tree predicts with 'predict_batch()' and has no Node structure.
+        """
+        import model_io
 
-        return [traverse(self.root, datapoint) for datapoint in test_data]
+        model = model_io.load(path, "decision_tree")
+        solution = cls(**model.meta)
+        solution.tree = FlatTree(**model.arrays)
+        return solution
 
     """
   Students are encouraged to implement as many additional methods as they find helpful in completing
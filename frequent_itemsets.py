@@ -0,0 +1,146 @@
+"""
+Frequent itemset mining over a file of transactions, one transaction of ";"-separated items per line.
+
+    python frequent_itemsets.py [categories.txt] [--min-sup 0.01] [--part1 part1.txt] [--part2 part2.txt]
+
+The file is read once: every item gets an integer id and the set of transactions containing it, stored as the bits of
+a Python int. Frequent itemsets are then mined depth-first with Eclat: an itemset's transactions are the intersection
+(a bitwise and) of its items' transactions and its support is the number of set bits, so supports are never counted
+by rescanning the transactions. Like Apriori.cpp, the frequent items are written to part1.txt and all the frequent
+itemsets, level by level, to part2.txt, one "count:item;item" line each. An itemset is frequent when
+count / transactions >= min_sup.
+"""
+
+import argparse
+import math
+from array import array
+from typing import Iterator, List, Tuple
+
+import dataset
+
+DELIMITER = ";"
+MIN_SUP = 0.01
+
+Itemset = Tuple[int, List[str]]
+
+
+def read_transactions(path: str) -> Tuple[List[str], List[array], int]:
+    """
+    Read a transaction file in one pass with dataset.read_transactions.
+
+    Returns:
+    Tuple[List[str], List[array], int]: The item names by id, the ids of the transactions containing every item and
+    the number of transactions. An item repeated within a transaction is counted once, blank lines are skipped.
+    """
+    transactions = dataset.read_transactions(path, DELIMITER)
+    tids: List[array] = [array("l") for _ in transactions.names]
+    for tid in range(len(transactions)):
+        for item_id in set(transactions[tid]):
+            tids[item_id].append(tid)
+    return transactions.names, tids, len(transactions)
+
+
+def min_support_count(min_sup: float, total: int) -> int:
+    """
+    The smallest support count c with c / total >= min_sup, evaluated with the same floating point division as the
+    support test of Apriori.cpp.
+    """
+    count = max(0, math.ceil(min_sup * total))
+    while count > 0 and (count - 1) / total >= min_sup:
+        count -= 1
+    while count / total < min_sup:
+        count += 1
+    return count
+
+
+def bitset(tids: array, total: int) -> int:
+    # the transactions as the set bits of an int, built in one go instead of one bit at a time
+    bits = bytearray((total + 7) // 8)
+    for tid in tids:
+        bits[tid >> 3] |= 1 << (tid & 7)
+    return int.from_bytes(bits, "little")
+
+
+def eclat(
+    tidsets: List[Tuple[int, int]], min_count: int
+) -> Iterator[Tuple[int, List[int]]]:
+    """
+    Mine the frequent itemsets depth-first.
+
+    Parameters:
+    tidsets (List[Tuple[int, int]]): Every frequent item as (item id, transaction bitset).
+    min_count (int): The minimum support count.
+
+    Yields:
+    Tuple[int, List[int]]: The support count and item ids of every frequent itemset.
+    """
+    # extending the rarest items first keeps the intersections small
+    tail = sorted(
+        ((item, tids, tids.bit_count()) for item, tids in tidsets),
+        key=lambda entry: entry[2],
+    )
+    stack = [([], tail)]
+    while stack:
+        prefix, tail = stack.pop()
+        for index, (item, tids, count) in enumerate(tail):
+            itemset = prefix + [item]
+            yield count, itemset
+
+            extensions = []
+            for other, other_tids, _ in tail[index + 1 :]:
+                both = tids & other_tids
+                both_count = both.bit_count()
+                if both_count >= min_count:
+                    extensions.append((other, both, both_count))
+            if extensions:
+                stack.append((itemset, extensions))
+
+
+def mine(path: str, min_sup: float = MIN_SUP) -> Tuple[List[Itemset], int]:
+    """
+    Find the frequent itemsets of a transaction file.
+
+    Returns:
+    Tuple[List[Itemset], int]: Every frequent itemset as (count, sorted item names), by size, then by decreasing
+    count, then by items, and the number of transactions.
+    """
+    names, tids, total = read_transactions(path)
+    if total == 0:
+        return [], 0
+    min_count = min_support_count(min_sup, total)
+    frequent = [
+        (item, bitset(item_tids, total))
+        for item, item_tids in enumerate(tids)
+        if len(item_tids) >= min_count
+    ]
+    itemsets = [
+        (count, sorted(names[item] for item in itemset))
+        for count, itemset in eclat(frequent, min_count)
+    ]
+    itemsets.sort(key=lambda entry: (len(entry[1]), -entry[0], entry[1]))
+    return itemsets, total
+
+
+def write_itemsets(path: str, itemsets: List[Itemset]):
+    with open(path, "w") as f:
+        for count, items in itemsets:
+            f.write(f"{count}:{DELIMITER.join(items)}\n")
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Mine the frequent itemsets of a file."
+    )
+    parser.add_argument("input", nargs="?", default="./categories.txt")
+    parser.add_argument("--min-sup", type=float, default=MIN_SUP)
+    parser.add_argument("--part1", default="part1.txt")
+    parser.add_argument("--part2", default="part2.txt")
+    args = parser.parse_args(argv)
+
+    itemsets, _ = mine(args.input, args.min_sup)
+    write_itemsets(args.part1, [entry for entry in itemsets if len(entry[1]) == 1])
+    write_itemsets(args.part2, itemsets)
+
+
+if __name__ == "__main__":
+    main()
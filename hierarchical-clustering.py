@@ -1,7 +1,18 @@
 # Submit this file to Gradescope
-from typing import List, Callable
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+from array import array
+from collections import OrderedDict
 from enum import Enum
+import hashlib
+import heapq
 import math
+import sys
+import time
+
+# the repository modules are imported where they are used, so this file also works on its own
+if TYPE_CHECKING:
+    from dataset import Dataset
+
 # you may use other Python standard libraries, but not data
 # science libraries, such as numpy, scikit-learn, etc.
 
@@ -12,6 +23,23 @@ class SimMethod(Enum):
     AVERAGE = 2
 
 
+# dendrograms of the most recently clustered datasets, by data digest and linkage
+DENDROGRAM_CACHE_SIZE = 8
+_dendrogram_cache: "OrderedDict[Tuple[bytes, SimMethod], Dendrogram]" = OrderedDict()
+
+
+def is_dataset(data) -> bool:
+    # a Dataset exists only once dataset.py is imported, so this file does not need to import it
+    dataset = sys.modules.get("dataset")
+    return dataset is not None and isinstance(data, dataset.Dataset)
+
+
+def active_recorder():
+    # the enabled instrumentation recorder; instrumentation.py is not imported unless something enabled it
+    instrumentation = sys.modules.get("instrumentation")
+    return None if instrumentation is None else instrumentation.active
+
+
 class Solution:
     def hclus_single_link(self, X: List[List[float]], K: int) -> List[int]:
         """Single link hierarchical clustering
@@ -22,65 +50,370 @@ class Solution:
           A list of integers (range from 0 to K - 1) that represent class labels.
           The number does not matter as long as the clusters are correct.
           For example: [0, 0, 1] is treated the same as [1, 1, 0]"""
-
-        # implement this function
-        def cluster_dist(c1: set[int], c2: set[int]) -> float:
-            return min(euclidean(X[p1], X[p2]) for p1 in c1 for p2 in c2)
-
-        return self.__hclus(X, K, cluster_dist)
+        return self.dendrogram(X, SimMethod.SINGLE).cut(K)
 
     def hclus_average_link(self, X: List[List[float]], K: int) -> List[int]:
         """Average link hierarchical clustering"""
-
-        # implement this function
-        def cluster_dist(c1: set[int], c2: set[int]) -> float:
-            dists = [euclidean(X[p1], X[p2]) for p1 in c1 for p2 in c2]
-            return sum(dists) / len(dists)
-
-        return self.__hclus(X, K, cluster_dist)
+        return self.dendrogram(X, SimMethod.AVERAGE).cut(K)
 
     def hclus_complete_link(self, X: List[List[float]], K: int) -> List[int]:
         """Complete link hierarchical clustering"""
+        return self.dendrogram(X, SimMethod.COMPLETE).cut(K)
 
-        # implement this function
-        def cluster_dist(c1: set[int], c2: set[int]) -> float:
-            return max(euclidean(X[p1], X[p2]) for p1 in c1 for p2 in c2)
+    def dendrogram(
+        self, X: "List[List[float]] | Dataset", method: SimMethod
+    ) -> "Dendrogram":
+        """The complete merge tree of X under the given linkage
+        Args:
+          - X: input data, rows or a Dataset (copied into row tuples)
+          - method: the linkage
+        Returns:
+          The dendrogram, shared with earlier calls on the same data and linkage"""
+        key = (data_digest(X), method)
+        recorder = active_recorder()
+        if key in _dendrogram_cache:
+            if recorder is not None:
+                recorder.count("hclus.cache_hits")
+            _dendrogram_cache.move_to_end(key)
+            return _dendrogram_cache[key]
 
-        return self.__hclus(X, K, cluster_dist)
+        if is_dataset(X):
+            # a deliberate copy: every distance reads two whole points, which row tuples
+            # serve far faster than d column lookups, and the n rows built once are small
+            # next to the n^2 distances computed from them
+            X = X.rows()
+        if method == SimMethod.SINGLE:
+            dendrogram = self.__mst_single_link(X)
+        else:
+            dendrogram = self.__hclus(X, method)
+        _dendrogram_cache[key] = dendrogram
+        if len(_dendrogram_cache) > DENDROGRAM_CACHE_SIZE:
+            _dendrogram_cache.popitem(last=False)
+        return dendrogram
 
-    def __hclus(
-        self,
-        X: List[List[float]],
-        K: int,
-        dist_func: Callable[[set[int], set[int]], float],
-    ):
-        clusters = [{i} for i in range(len(X))]
-        while len(clusters) != K:
+    def __hclus(self, X: List[List[float]], method: SimMethod) -> "Dendrogram":
+        """Agglomerative clustering over a distance matrix computed once.
+
+        Clusters are named after their smallest point and the closest pair is merged,
+        ties going to the pair with the smallest names, exactly like rescanning all
+        cluster pairs would. Merged distances follow the Lance-Williams update of the
+        linkage, and every cluster caches its nearest neighbour among the clusters with
+        larger names, so a merge rescans only the rows whose neighbour was merged.
+
+        Single and complete link merge exactly like recomputing the cluster distances
+        from the points. Average link may not where two average distances are
+        mathematically equal (e.g. on lattice data): the weighted update and a mean
+        summed point by point round differently, and the smaller rounded value wins.
+        """
+        n = len(X)
+        recorder = active_recorder()
+        if recorder is not None:
+            start = time.perf_counter()
+        dist = DistanceMatrix(X)
+        update = LANCE_WILLIAMS[method]
+        dendrogram = Dendrogram(n)
+
+        clusters = list(range(n))
+        size = [1] * n
+        node = list(range(n))
+        nearest = [-1] * n
+        min_dist = [math.inf] * n
+        for i in clusters:
+            nearest[i], min_dist[i] = dist.nearest(i)
+        if recorder is not None:
+            built = time.perf_counter()
+        rescans = 0
+
+        for _ in range(n - 1):
             # find the clusters to be merged
-            to_merge = (None, None)
-            min_dist = math.inf
-            for i in range(len(clusters)):
-                for j in range(i + 1, len(clusters)):
-                    dist = dist_func(clusters[i], clusters[j])
-                    if dist < min_dist:
-                        min_dist = dist
-                        to_merge = (i, j)
-
-            # merge the two clusters
-            i, j = to_merge
-            if i is None or j is None:
-                break
-            clusters[i] = clusters[i] | clusters[j]
-            del clusters[j]
-
-        # assign the label under the correct index
-        result = [0] * len(X)
-        for i, cluster in enumerate(clusters):
-            for index in cluster:
-                result[index] = i
+            i = min(clusters, key=min_dist.__getitem__)
+            j = nearest[i]
+
+            # merge the two clusters, updating their distances to the others
+            dist.merge(i, j, clusters, update, size[i], size[j])
+            clusters.remove(j)
+            size[i] += size[j]
+            node[i] = dendrogram.add(node[i], node[j], min_dist[i], size[i])
+            nearest[j], min_dist[j] = -1, math.inf
+
+            # refresh the nearest neighbours the merge may have changed
+            nearest[i], min_dist[i] = dist.nearest(i)
+            for k in clusters:
+                if k >= j:
+                    break
+                if nearest[k] == i or nearest[k] == j:
+                    nearest[k], min_dist[k] = dist.nearest(k)
+                    rescans += 1
+                elif k < i and (dist[k, i], i) < (min_dist[k], nearest[k]):
+                    nearest[k], min_dist[k] = i, dist[k, i]
+
+        if recorder is not None:
+            merged = time.perf_counter()
+            recorder.count("hclus.distance_evaluations", n * (n - 1) // 2)
+            recorder.count("hclus.merges", n - 1)
+            recorder.count("hclus.nearest_rescans", rescans)
+            recorder.add_time("hclus.matrix.seconds", built - start)
+            recorder.add_time("hclus.merge.seconds", merged - built)
+            recorder.emit(
+                "hclus.dendrogram",
+                method=method.name,
+                n=n,
+                nearest_rescans=rescans,
+                seconds=merged - start,
+            )
+        return dendrogram
+
+    def __mst_single_link(self, X: List[List[float]]) -> "Dendrogram":
+        """Single link clustering from a minimum spanning tree, in O(n) memory.
+
+        Prim's algorithm grows the tree computing distances on the fly, and single link
+        merges along the tree edges from the lightest. Where several tree edges share a
+        weight w, the merges at w are replayed in __hclus order without storing point
+        pairs: the clusters joined at w are visited by name, and each one absorbs, one at
+        a time, the smallest-named cluster with a point at distance w from what it has
+        absorbed so far, found by scanning the members of every newly absorbed cluster.
+        This is the order of always merging the pair of smallest names at w, so every
+        cut of the dendrogram is the partition __hclus gives.
+        """
+        n = len(X)
+        recorder = active_recorder()
+        if recorder is not None:
+            start = time.perf_counter()
+
+        # grow the minimum spanning tree from point 0
+        in_tree = bytearray(n)
+        best = [math.inf] * n
+        link = [-1] * n
+        edges = []
+        v = 0
+        for _ in range(n - 1):
+            in_tree[v] = 1
+            best[v] = math.inf
+            pv = X[v]
+            for u, pu in enumerate(X):
+                if not in_tree[u]:
+                    d = euclidean(pv, pu)
+                    if d < best[u]:
+                        best[u], link[u] = d, v
+            v = min(range(n), key=best.__getitem__)
+            edges.append((best[v], min(link[v], v), max(link[v], v)))
+        edges.sort()
+
+        # merge along the tree edges, lightest first, keeping the members of every
+        # cluster as a linked list
+        dendrogram = Dendrogram(n)
+        parent = list(range(n))
+        node = list(range(n))
+        size = [1] * n
+        next_member = [-1] * n
+        last_member = list(range(n))
+        tie_evaluations = 0
+
+        def merge(p: int, q: int, weight: float):
+            # merge the clusters named p < q into p
+            parent[q] = p
+            size[p] += size[q]
+            node[p] = dendrogram.add(node[p], node[q], weight, size[p])
+            next_member[last_member[p]] = q
+            last_member[p] = last_member[q]
+
+        def members(p: int) -> List[int]:
+            points = []
+            while p != -1:
+                points.append(p)
+                p = next_member[p]
+            return points
+
+        start_edge = 0
+        while start_edge < len(edges):
+            weight = edges[start_edge][0]
+            end_edge = start_edge + 1
+            while end_edge < len(edges) and edges[end_edge][0] == weight:
+                end_edge += 1
+            # the clusters joined at this weight, by name
+            roots = sorted(
+                {
+                    find(parent, p)
+                    for edge in edges[start_edge:end_edge]
+                    for p in edge[1:]
+                }
+            )
+            if len(roots) == 2:
+                merge(*roots, weight)
+                start_edge = end_edge
+                continue
+
+            seen = set()
+            for root in roots:
+                if root in seen:
+                    continue
+                seen.add(root)
+                frontier: List[int] = []
+                scan = members(root)
+                while True:
+                    # the clusters at this weight from the points absorbed last
+                    for other in roots:
+                        if other in seen:
+                            continue
+                        other_points = [X[q] for q in members(other)]
+                        for p in scan:
+                            point = X[p]
+                            tie_evaluations += len(other_points)
+                            if any(euclidean(point, q) == weight for q in other_points):
+                                seen.add(other)
+                                heapq.heappush(frontier, other)
+                                break
+                    if not frontier:
+                        break
+                    other = heapq.heappop(frontier)
+                    scan = members(other)
+                    merge(root, other, weight)
+            start_edge = end_edge
+
+        if recorder is not None:
+            seconds = time.perf_counter() - start
+            tied = {
+                w for (w, _, _), (next_w, _, _) in zip(edges, edges[1:]) if w == next_w
+            }
+            recorder.count(
+                "hclus.distance_evaluations", n * (n - 1) // 2 + tie_evaluations
+            )
+            recorder.count("hclus.merges", n - 1)
+            recorder.add_time("hclus.mst.seconds", seconds)
+            recorder.emit(
+                "hclus.dendrogram",
+                method=SimMethod.SINGLE.name,
+                n=n,
+                tied_weights=len(tied),
+                seconds=seconds,
+            )
+        return dendrogram
+
+
+class Dendrogram:
+    """The merge history of an agglomerative clustering of n points.
+
+    Points are nodes 0 to n - 1 and merge t creates node n + t out of nodes left[t] and
+    right[t], at the given distance and with the given number of points, in the order
+    the merges happen."""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.left = array("q")
+        self.right = array("q")
+        self.distance = array("d")
+        self.size = array("q")
+
+    def add(self, left: int, right: int, distance: float, size: int) -> int:
+        """Record a merge and return the id of the merged node."""
+        self.left.append(left)
+        self.right.append(right)
+        self.distance.append(distance)
+        self.size.append(size)
+        return self.n + len(self.left) - 1
+
+    def cut(self, K: int) -> List[int]:
+        """Labels of the K clusters left after the first n - K merges, in linear time.
+        Clusters are numbered in order of their smallest point."""
+        n = self.n
+        if not 1 <= K <= n:
+            raise ValueError(f"cannot split {n} points into {K} clusters")
+        parent = list(range(2 * n - K))
+        for t in range(n - K):
+            parent[self.left[t]] = parent[self.right[t]] = n + t
+
+        result = [0] * n
+        labels = {}
+        for index in range(n):
+            result[index] = labels.setdefault(find(parent, index), len(labels))
         return result
 
 
+class DistanceMatrix:
+    """Condensed pairwise distance matrix, row i holding the distances to points j > i.
+    Entries of merged-away clusters are set to infinity so row scans skip them."""
+
+    def __init__(self, X: List[List[float]]):
+        self.n = n = len(X)
+        self.values = array(
+            "d", (euclidean(X[i], X[j]) for i in range(n) for j in range(i + 1, n))
+        )
+        # (i, j) is stored at offsets[i] + j
+        self.offsets = [i * (2 * n - i - 1) // 2 - i - 1 for i in range(n)]
+
+    def __getitem__(self, pair: Tuple[int, int]) -> float:
+        i, j = pair
+        if i > j:
+            i, j = j, i
+        return self.values[self.offsets[i] + j]
+
+    def nearest(self, i: int) -> Tuple[int, float]:
+        """The closest point j > i, the smallest on ties, and its distance."""
+        start = self.offsets[i] + i + 1
+        row = self.values[start : start + self.n - i - 1]
+        d = min(row, default=math.inf)
+        if d == math.inf:
+            return -1, math.inf
+        return row.index(d) + i + 1, d
+
+    def merge(
+        self,
+        i: int,
+        j: int,
+        clusters: List[int],
+        update: Callable[[float, float, int, int], float],
+        n_i: int,
+        n_j: int,
+    ):
+        """Merge cluster j (> i) into cluster i, updating the distances from i to the
+        other clusters with the given Lance-Williams update and removing j."""
+        values, offsets = self.values, self.offsets
+        for k in clusters:
+            if k == i or k == j:
+                continue
+            ik = offsets[k] + i if k < i else offsets[i] + k
+            jk = offsets[k] + j if k < j else offsets[j] + k
+            values[ik] = update(values[ik], values[jk], n_i, n_j)
+
+        for k in range(j):
+            values[offsets[k] + j] = math.inf
+        start = offsets[j] + j + 1
+        values[start : start + self.n - j - 1] = array("d", [math.inf]) * (
+            self.n - j - 1
+        )
+
+
+LANCE_WILLIAMS: Dict[SimMethod, Callable[[float, float, int, int], float]] = {
+    SimMethod.SINGLE: lambda d_ik, d_jk, n_i, n_j: min(d_ik, d_jk),
+    SimMethod.COMPLETE: lambda d_ik, d_jk, n_i, n_j: max(d_ik, d_jk),
+    SimMethod.AVERAGE: lambda d_ik, d_jk, n_i, n_j: (n_i * d_ik + n_j * d_jk)
+    / (n_i + n_j),
+}
+
+
+def find(parent: List[int], p: int) -> int:
+    """The root of p in a union-find forest."""
+    while parent[p] != p:
+        parent[p] = parent[parent[p]]
+        p = parent[p]
+    return p
+
+
+def data_digest(X: "List[List[float]] | Dataset") -> bytes:
+    """A digest identifying the points of X."""
+    digest = hashlib.blake2b()
+    if is_dataset(X):
+        for column in X.columns:
+            digest.update(memoryview(column).format.encode())
+            digest.update(memoryview(column).cast("B"))
+        digest.update(len(X.columns).to_bytes(4, "little"))
+        return digest.digest()
+    for point in X:
+        digest.update(array("d", point).tobytes())
+        digest.update(len(point).to_bytes(4, "little"))
+    return digest.digest()
+
+
 def euclidean(p1: List[float], p2: List[float]):
     return math.sqrt(sum((coord1 - coord2) ** 2 for coord1, coord2 in zip(p1, p2)))
 
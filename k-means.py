@@ -1,22 +1,22 @@
+import argparse
+import math
 import random
 import sys
-from collections import defaultdict
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from operator import mul
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+import dataset
+import instrumentation
+import model_io
 
 # CONSTANT
 K = 3
 
-# extract data from the file
-data: list[tuple] = []
-with open("./test.txt") as file:
-    while output := file.readline():
-        data.append(
-            tuple(
-                map(
-                    lambda x: float(x),
-                    output.strip().split(",", 1),
-                )
-            )
-        )
+Point = Sequence[float]
 
 
 # Helpers
@@ -24,71 +24,572 @@ def euclidean(p1, p2):
     return sum((a - b) ** 2 for a, b in zip(p1, p2))
 
 
-def kmeans_plus_plus_init(data, k):
-    centroids = []
-    centroids.append(random.choice(data))
+def read_points(path: str) -> List[tuple]:
+    # extract data from the file, one comma separated point per line
+    return dataset.read_numeric(path, delimiter=",").rows()
+
+
+def read_chunks(path: str, chunk_size: int) -> Iterator[List[tuple]]:
+    # stream the points of the file in lists of at most chunk_size points
+    chunk: List[tuple] = []
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                chunk.append(tuple(map(float, line.strip().split(","))))
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def reservoir_sample(
+    chunks: Iterable[Sequence[Point]], size: int, rng=random
+) -> List[Point]:
+    # a uniform sample of size points from a stream of chunks, in memory for size points
+    sample: List[Point] = []
+    seen = 0
+    for chunk in chunks:
+        for point in chunk:
+            seen += 1
+            if len(sample) < size:
+                sample.append(point)
+            else:
+                slot = rng.randrange(seen)
+                if slot < size:
+                    sample[slot] = point
+    return sample
+
+
+def kmeans_plus_plus_init(data, k, rng=random, weights=None):
+    """
+    Pick k of the points as initial centroids with k-means++: the first one at random, every next one with a
+    probability proportional to its squared distance to the closest centroid picked so far (times its weight, if the
+    points are weighted). The distances to the closest centroid are kept across picks and updated with the new
+    centroid only, so every pick costs one distance per point. Fewer than k centroids are returned only if the points
+    have fewer than k distinct values.
+    """
+    if weights is None:
+        centroids = [rng.choice(data)]
+    else:
+        centroids = rng.choices(data, weights)
+    distances = [euclidean(point, centroids[0]) for point in data]
 
     for _ in range(1, k):
-        distances = []
+        weighted = distances if weights is None else list(map(mul, distances, weights))
+        total = sum(weighted)
+        if total == 0:
+            break
 
-        for point in data:
-            min_dist_sq = min(euclidean(point, c) for c in centroids)
-            distances.append(min_dist_sq)
+        # weighted random choice based on squared distances, the first point whose cumulative probability exceeds a
+        # random threshold
+        cumulative = list(accumulate(d / total for d in weighted))
+        chosen = bisect_right(cumulative, rng.random())
+        if chosen == len(data):
+            # the probabilities summed up to just below the threshold
+            chosen = max(i for i, d in enumerate(weighted) if d > 0)
+        centroid = data[chosen]
+        centroids.append(centroid)
+        distances = [min(d, euclidean(p, centroid)) for d, p in zip(distances, data)]
+    return centroids
 
-        # weighted random choice based on squared distances
+
+def kmeans_parallel_init(data, k, rng=random, oversampling=None, rounds=5):
+    """
+    Pick k of the points as initial centroids with k-means|| (Bahmani et al.).
+
+    Starting from one random point, every round samples each point independently with probability
+    oversampling * distance / total distance, where distance is its squared distance to the closest candidate so far,
+    so the number of passes over the data does not depend on k. Each round updates the cached distances with the new
+    candidates only. After the rounds (and more of them, should fewer than k candidates have been sampled), every
+    candidate is weighted by the number of points closest to it and k-means++ picks the k centroids among the
+    weighted candidates.
+
+    Parameters:
+    oversampling (int | None): The expected number of candidates sampled per round, 2 * k by default.
+    rounds (int): The number of sampling rounds.
+    """
+    oversampling = oversampling or 2 * k
+    candidates = [rng.choice(data)]
+    distances = [euclidean(point, candidates[0]) for point in data]
+    owners = [0] * len(data)
+
+    done = 0
+    while done < rounds or len(candidates) < k:
+        done += 1
         total = sum(distances)
-        probs = [d / total for d in distances]
-
-        # a random threshold for CMP
-        r = random.random()
-        cumulative = 0
-        for point, prob in zip(data, probs):
-            cumulative += prob
-            if r < cumulative:
-                centroids.append(point)
+        if total == 0:
+            break
+        new = [
+            data[i]
+            for i, d in enumerate(distances)
+            if rng.random() * total < oversampling * d
+        ]
+
+        # one pass updating the distances and owners with this round's candidates
+        base = len(candidates)
+        candidates.extend(new)
+        for i, point in enumerate(data):
+            for j, candidate in enumerate(new, base):
+                d = euclidean(point, candidate)
+                if d < distances[i]:
+                    distances[i] = d
+                    owners[i] = j
+
+    if len(candidates) <= k:
+        return candidates
+    weights = [0] * len(candidates)
+    for owner in owners:
+        weights[owner] += 1
+    return kmeans_plus_plus_init(candidates, k, rng, weights)
+
+
+INITS = {"k-means++": kmeans_plus_plus_init, "k-means||": kmeans_parallel_init}
+
+
+def nearest(point: Point, centroids: Sequence[Point]) -> int:
+    # the index of the closest centroid, the first one on ties
+    return min(
+        enumerate(map(lambda centroid: euclidean(point, centroid), centroids)),
+        key=lambda x: x[1],
+    )[0]
+
+
+class LloydAssigner:
+    """
+    Assigns every point to its nearest centroid by computing all the distances.
+    """
+
+    def __init__(self, points: Sequence[Point]):
+        self.points = points
+        self.computed = 0
+        self.skipped = 0
+
+    def assign(self, centroids: Sequence[Point]) -> List[int]:
+        self.computed += len(self.points) * len(centroids)
+        return [nearest(point, centroids) for point in self.points]
+
+
+class HamerlyAssigner:
+    """
+    Assigns every point to its nearest centroid, skipping the distances that cannot change the assignment
+    (Hamerly's algorithm).
+
+    Every point keeps an upper bound on the distance to its centroid and a lower bound on the distance to any other
+    centroid. When the centroids move, the bounds are loosened by how far the centroids moved; a point keeps its
+    centroid without computing anything when its upper bound is below both its lower bound and half the distance from
+    its centroid to the closest other centroid. Otherwise the upper bound is tightened, and only if that does not
+    settle it are all k distances computed, exactly like LloydAssigner, so the assignments (ties included) are the
+    same. The bounds carry a small relative slack so rounding in the square roots never prunes a close call.
+    """
+
+    SLACK = 1e-9
+
+    def __init__(self, points: Sequence[Point]):
+        self.points = points
+        self.computed = 0
+        self.skipped = 0
+        self.previous: List[Point] = []
+
+    def assign(self, centroids: Sequence[Point]) -> List[int]:
+        if not self.previous:
+            self.labels = [0] * len(self.points)
+            self.upper = [0.0] * len(self.points)
+            self.lower = [0.0] * len(self.points)
+            for i, point in enumerate(self.points):
+                self.full_scan(i, point, centroids)
+            self.previous = list(centroids)
+            return list(self.labels)
+
+        k = len(centroids)
+        drift = [
+            math.sqrt(euclidean(old, new)) for old, new in zip(self.previous, centroids)
+        ]
+        farthest = max(range(k), key=drift.__getitem__)
+        max_drift = drift[farthest]
+        second_drift = max(
+            (d for j, d in enumerate(drift) if j != farthest), default=0.0
+        )
+        half_gap = [
+            0.5
+            * math.sqrt(
+                min(
+                    (
+                        euclidean(c, other)
+                        for j2, other in enumerate(centroids)
+                        if j2 != j
+                    ),
+                    default=math.inf,
+                )
+            )
+            for j, c in enumerate(centroids)
+        ]
+
+        keep = 1 - self.SLACK
+        labels, upper, lower = self.labels, self.upper, self.lower
+        for i, point in enumerate(self.points):
+            a = labels[i]
+            upper[i] += drift[a]
+            lower[i] -= second_drift if a == farthest else max_drift
+            bound = max(half_gap[a], lower[i]) * keep
+            if upper[i] < bound:
+                self.skipped += k
+                continue
+
+            # tighten the upper bound before giving up
+            d_a = euclidean(point, centroids[a])
+            upper[i] = math.sqrt(d_a)
+            if upper[i] < bound:
+                self.computed += 1
+                self.skipped += k - 1
+                continue
+            self.full_scan(i, point, centroids, a, d_a)
+
+        self.previous = list(centroids)
+        return list(labels)
+
+    def full_scan(
+        self,
+        i: int,
+        point: Point,
+        centroids: Sequence[Point],
+        known: int = -1,
+        known_dist: float = 0.0,
+    ):
+        # compute every distance (reusing a known one) and reset the bounds of point i
+        distances = [
+            known_dist if j == known else euclidean(point, c)
+            for j, c in enumerate(centroids)
+        ]
+        self.computed += len(centroids)
+        best = min(enumerate(distances), key=lambda x: x[1])[0]
+        self.labels[i] = best
+        self.upper[i] = math.sqrt(distances[best])
+        self.lower[i] = math.sqrt(
+            min((d for j, d in enumerate(distances) if j != best), default=math.inf)
+        )
+
+
+ASSIGNERS = {"lloyd": LloydAssigner, "hamerly": HamerlyAssigner}
+
+
+class KMeans:
+    """
+    K-means clustering of points of any dimensionality, seeded with k-means++ or k-means||.
+
+    Every iteration assigns the points to their nearest centroid, moves each centroid to the mean of its points (a
+    centroid without points stays put) and computes the SSE against the moved centroids. Fitting stops once an
+    iteration improves the SSE by no more than tol, or after max_iter iterations. The assignment step is done by
+    HamerlyAssigner ("hamerly") or by computing every distance ("lloyd"), with the same result.
+
+    With n_init > 1 the clustering is restarted n_init times from seeds drawn from seed, on n_jobs processes if more
+    than one, and the restart with the lowest SSE is kept (the first one on ties). A single restart uses seed itself.
+
+    After fit():
+    - centroids: The centroids that the iteration with the lowest SSE assigned the points to, so predict() on the
+      training points gives labels
+    - labels: The cluster of every point, from the iteration with the lowest SSE
+    - sse: That lowest SSE, measured against the means of the clusters in labels
+    - n_iter: The number of iterations run
+    - distances_computed, distances_skipped: How many point-to-centroid distances the assignment steps of all the
+      restarts computed and skipped
+    """
+
+    def __init__(
+        self,
+        max_iter: int | None = 300,
+        tol: float = 0.0,
+        seed: int | None = None,
+        algorithm: str = "hamerly",
+        init: str = "k-means++",
+        n_init: int = 1,
+        n_jobs: int | None = None,
+    ):
+        self.max_iter = max_iter
+        self.tol = tol
+        self.seed = seed
+        self.algorithm = algorithm
+        self.init = init
+        self.n_init = n_init
+        self.n_jobs = n_jobs
+
+    def fit(self, points: Sequence[Point], k: int) -> "KMeans":
+        if self.n_init == 1:
+            runs = [self.run(points, k, self.seed)]
+        else:
+            master = random.Random(self.seed)
+            seeds = [master.randrange(2**32) for _ in range(self.n_init)]
+            if self.n_jobs is not None and self.n_jobs > 1:
+                # the points are handed to every worker once, not with every restart
+                with ProcessPoolExecutor(
+                    min(self.n_jobs, self.n_init),
+                    initializer=attach_restart,
+                    initargs=(self, points),
+                ) as pool:
+                    runs = list(pool.map(run_restart, [k] * len(seeds), seeds))
+            else:
+                runs = [self.run(points, k, seed) for seed in seeds]
+
+        best = min(runs, key=lambda run: run[2])
+        self.centroids, self.labels, self.sse, self.n_iter = best[:4]
+        self.distances_computed = sum(run[4] for run in runs)
+        self.distances_skipped = sum(run[5] for run in runs)
+        return self
+
+    def run(self, points: Sequence[Point], k: int, seed: int | None) -> Tuple:
+        """
+        Cluster the points once from the given seed.
+
+        Returns:
+        Tuple: The centroids, labels, SSE, iterations and distances computed and skipped.
+        """
+        rng = random.Random(seed)
+        centroids = INITS[self.init](points, k, rng)
+        dim = len(points[0])
+        sse_record = sys.float_info.max
+        labels = [0] * len(points)
+        best_centroids = centroids
+        assigner = ASSIGNERS[self.algorithm](points)
+        recorder = instrumentation.active
+
+        n_iter = 0
+        while self.max_iter is None or n_iter < self.max_iter:
+            n_iter += 1
+            if recorder is not None:
+                start = time.perf_counter()
+
+            # cluster it, summing up the points of every cluster
+            assignments = assigner.assign(centroids)
+            if recorder is not None:
+                assigned = time.perf_counter()
+            sums = [[0.0] * dim for _ in centroids]
+            counts = [0] * len(centroids)
+            for point, cluster in zip(points, assignments):
+                counts[cluster] += 1
+                total = sums[cluster]
+                for d, coord in enumerate(point):
+                    total[d] += coord
+
+            # update the centroid, keeping the ones the points were just assigned to
+            assigned_to = list(centroids)
+            for cluster, (total, count) in enumerate(zip(sums, counts)):
+                if count:
+                    centroids[cluster] = tuple(coord / count for coord in total)
+
+            # calculate the sse
+            sse = 0
+            for point, cluster in zip(points, assignments):
+                sse += euclidean(point, centroids[cluster])
+
+            if recorder is not None:
+                updated = time.perf_counter()
+                recorder.add_time("kmeans.assign.seconds", assigned - start)
+                recorder.add_time("kmeans.update.seconds", updated - assigned)
+                recorder.emit(
+                    "kmeans.iteration",
+                    iteration=n_iter,
+                    sse=sse,
+                    distances_computed=assigner.computed,
+                    distances_skipped=assigner.skipped,
+                    seconds=updated - start,
+                )
+
+            # use sse as threshold to stop the loop
+            if sse < sse_record:
+                labels, best_centroids = assignments, assigned_to
+            if sse >= sse_record - self.tol:
+                sse_record = min(sse, sse_record)
                 break
-    return centroids
+            sse_record = sse
 
+        if recorder is not None:
+            recorder.count("kmeans.runs")
+            recorder.count("kmeans.iterations", n_iter)
+            recorder.count("kmeans.distance_evaluations", assigner.computed)
+            recorder.count("kmeans.distances_skipped", assigner.skipped)
+        return (
+            best_centroids,
+            labels,
+            sse_record,
+            n_iter,
+            assigner.computed,
+            assigner.skipped,
+        )
+
+    def predict(self, points: Sequence[Point]) -> List[int]:
+        return [nearest(point, self.centroids) for point in points]
+
+    def save(self, path: str):
+        model_io.save_centroids(path, self.centroids)
+
+    @classmethod
+    def load(cls, path: str) -> "KMeans":
+        # the centroids stay memory-mapped from the model file
+        kmeans = cls()
+        kmeans.centroids = model_io.load_centroids(path)
+        return kmeans
+
+
+# the model and points of the restarts run by a worker process
+_restart_model: KMeans | None = None
+_restart_points: Sequence[Point] = ()
+
+
+def attach_restart(model: KMeans, points: Sequence[Point]):
+    # initializer of the restart worker processes
+    global _restart_model, _restart_points
+    _restart_model, _restart_points = model, points
+
+
+def run_restart(k: int, seed: int) -> Tuple:
+    return _restart_model.run(_restart_points, k, seed)
+
+
+class MiniBatchKMeans:
+    """
+    Mini-batch k-means over a stream of chunks of points, in memory proportional to one chunk.
+
+    The centroids are seeded with k-means++ on the first chunk, or on a sample passed to init() beforehand, which is
+    safer when the input is ordered (e.g. a reservoir_sample() of the stream). Every chunk is then assigned to the current centroids
+    and added to per-cluster running sums and counts, and each centroid touched by the chunk moves to the mean of all
+    the points assigned to it so far (the per-center learning rate 1/count of mini-batch k-means). The sums and counts
+    carry over between passes, so later passes refine the centroids with a smaller and smaller step.
+
+    After fit_chunks() or partial_fit():
+    - centroids: The current centroids
+    - counts: How many points have been assigned to every centroid
+    - n_seen: How many points have been consumed
+    """
+
+    def __init__(self, k: int = K, seed: int | None = None):
+        self.k = k
+        self.rng = random.Random(seed)
+        self.centroids: List[Point] = []
+        self.n_seen = 0
+
+    def init(self, points: Sequence[Point]) -> "MiniBatchKMeans":
+        self.centroids = kmeans_plus_plus_init(points, self.k, self.rng)
+        self.sums = [[0.0] * len(points[0]) for _ in self.centroids]
+        self.counts = [0] * len(self.centroids)
+        return self
+
+    def partial_fit(self, chunk: Sequence[Point]) -> "MiniBatchKMeans":
+        if not chunk:
+            return self
+        if not self.centroids:
+            self.init(chunk)
+
+        centroids, sums, counts = self.centroids, self.sums, self.counts
+        touched = set()
+        for point in chunk:
+            cluster = nearest(point, centroids)
+            touched.add(cluster)
+            counts[cluster] += 1
+            total = sums[cluster]
+            for d, coord in enumerate(point):
+                total[d] += coord
+
+        # move the centroids only after the whole chunk was assigned
+        for cluster in touched:
+            count = counts[cluster]
+            centroids[cluster] = tuple(coord / count for coord in sums[cluster])
+        self.n_seen += len(chunk)
+        recorder = instrumentation.active
+        if recorder is not None:
+            recorder.count("kmeans.minibatch.chunks")
+            recorder.count("kmeans.distance_evaluations", len(chunk) * self.k)
+        return self
+
+    def fit_chunks(self, chunks: Iterable[Sequence[Point]]) -> "MiniBatchKMeans":
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    def predict(self, points: Sequence[Point]) -> List[int]:
+        return [nearest(point, self.centroids) for point in points]
+
+    def write_labels(self, chunks: Iterable[Sequence[Point]], path: str):
+        # a final pass labeling every point with its nearest centroid, one "index label" line per point
+        i = 0
+        with open(path, "w") as f:
+            for chunk in chunks:
+                for label in self.predict(chunk):
+                    f.write(f"{i} {label}\n")
+                    i += 1
+
+    def save(self, path: str):
+        model_io.save_centroids(path, self.centroids)
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Cluster the points of a file.")
+    parser.add_argument("input", nargs="?", default="./test.txt")
+    parser.add_argument("-k", type=int, default=K)
+    parser.add_argument("-o", "--output", default="clusters.txt")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--init", choices=sorted(INITS), default="k-means++")
+    parser.add_argument(
+        "--n-init", type=int, default=1, help="restarts, keeping the lowest SSE"
+    )
+    parser.add_argument("--n-jobs", type=int, help="processes running the restarts")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="stream the input in chunks of this many points (mini-batch k-means)",
+    )
+    parser.add_argument(
+        "--passes", type=int, default=1, help="passes over the input in mini-batch mode"
+    )
+    parser.add_argument(
+        "--init-size",
+        type=int,
+        help="seed mini-batch mode from a uniform sample of this many points (one extra pass)",
+    )
+    parser.add_argument(
+        "--no-labels",
+        action="store_true",
+        help="skip the final labeling pass in mini-batch mode",
+    )
+    parser.add_argument("--save", help="save the centroids to this model file")
+    parser.add_argument(
+        "--cache", help="a binary copy of the input, memory-mapped on later runs"
+    )
+    args = parser.parse_args(argv)
+
+    if args.batch_size:
+        minibatch = MiniBatchKMeans(args.k, seed=args.seed)
+        if args.init_size:
+            sample = reservoir_sample(
+                read_chunks(args.input, args.batch_size),
+                args.init_size,
+                minibatch.rng,
+            )
+            minibatch.init(sample)
+        for _ in range(args.passes):
+            minibatch.fit_chunks(read_chunks(args.input, args.batch_size))
+        if not args.no_labels:
+            minibatch.write_labels(
+                read_chunks(args.input, args.batch_size), args.output
+            )
+        if args.save:
+            minibatch.save(args.save)
+        return
+
+    data = dataset.load(args.input, cache_path=args.cache, delimiter=",")
+    kmeans = KMeans(
+        max_iter=None,
+        seed=args.seed,
+        init=args.init,
+        n_init=args.n_init,
+        n_jobs=args.n_jobs,
+    ).fit(data, args.k)
+
+    with open(args.output, "w") as f:
+        for i, record in enumerate(kmeans.labels):
+            f.write(f"{i} {record}\n")
+    if args.save:
+        kmeans.save(args.save)
 
-centroids = kmeans_plus_plus_init(data, K)
-sse_record = sys.float_info.max
-tmp_records = [0] * len(data)
-final_records = [0] * len(data)
-
-# update the data list
-while True:
-    # cluster it
-    cur_list = defaultdict(list)
-    for i, datum in enumerate(data):
-        cluster = min(
-            enumerate(
-                map(lambda centroid: euclidean(datum, centroid), centroids),
-            ),
-            key=lambda x: x[1],
-        )[0]
-        tmp_records[i] = cluster
-        cur_list[cluster].append(datum)
-
-    # update the centroid
-    for key, value in cur_list.items():
-        avg_x = sum(map(lambda x: x[0], value)) / len(value)
-        avg_y = sum(map(lambda x: x[1], value)) / len(value)
-        centroids[key] = (avg_x, avg_y)
-
-    # calculate the sse
-    sse = 0
-    for key, value in cur_list.items():
-        for point in value:
-            sse += euclidean(point, centroids[key])
-
-    # use sse as threshold to stop the loop
-    if sse >= sse_record:
-        break
-    else:
-        sse_record = sse
-        for i, record in enumerate(tmp_records):
-            final_records[i] = record
 
-with open("clusters.txt", "w") as f:
-    for i, record in enumerate(final_records):
-        f.write(f"{i} {record}\n")
+if __name__ == "__main__":
+    main()
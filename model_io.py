@@ -0,0 +1,148 @@
+"""
+Compact binary model files shared by the models of this repository.
+
+A model file is laid out as
+
+    magic (8 bytes) | version (uint32) | header length (uint32) | header (JSON) | arrays
+
+The small JSON header records the kind of model, its metadata and, for every named array, its typecode, offset and
+number of items. Every array starts on an 8-byte boundary, so load() maps the file read-only and hands out
+memoryviews cast to the stored type: the array data is neither parsed nor copied, and every process loading the same
+file shares one copy of its pages through the page cache.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Sequence
+
+MAGIC = b"CS412MDL"
+VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGNMENT = 8
+
+
+class ModelFile:
+    """
+    A loaded model file.
+
+    Attributes:
+    - kind: The kind of model stored in the file, e.g. "decision_tree"
+    - meta: The JSON metadata saved with the model
+    - arrays: The named arrays, as read-only memoryviews into the mapped file
+    """
+
+    def __init__(self, kind: str, meta: dict, arrays: Dict[str, memoryview]):
+        self.kind = kind
+        self.meta = meta
+        self.arrays = arrays
+
+
+def save(
+    path: str,
+    kind: str,
+    arrays: Dict[str, array | memoryview],
+    meta: dict | None = None,
+):
+    """
+    Write a model file. The file is written next to path and moved into place, so processes loading path never see a
+    partially written model.
+
+    Parameters:
+    path (str): The file to write.
+    kind (str): The kind of model, checked again by load().
+    arrays (Dict[str, array | memoryview]): The model's arrays by name, e.g. array("d") or arrays of a loaded model.
+    meta (dict | None): Any JSON-serializable metadata.
+    """
+    header = {
+        "kind": kind,
+        "byteorder": sys.byteorder,
+        "meta": meta or {},
+        "arrays": {},
+    }
+
+    # lay out the arrays after the header, the offsets are relative to the data start
+    views = {name: memoryview(values) for name, values in arrays.items()}
+    offset = 0
+    for name, view in views.items():
+        header["arrays"][name] = {
+            "typecode": view.format,
+            "offset": offset,
+            "length": len(view),
+        }
+        offset = align(offset + view.nbytes)
+    encoded = json.dumps(header).encode()
+    data_start = align(PREAMBLE.size + len(encoded))
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(bytes(data_start - f.tell()))
+        for name, view in views.items():
+            f.write(bytes(data_start + header["arrays"][name]["offset"] - f.tell()))
+            f.write(view)
+    os.replace(tmp_path, path)
+
+
+def load(path: str, kind: str | None = None) -> ModelFile:
+    """
+    Map a model file into memory.
+
+    Parameters:
+    path (str): The file to load.
+    kind (str | None): The expected kind of model, if any.
+
+    Returns:
+    ModelFile: The model's kind, metadata and arrays. The arrays stay valid for as long as they are referenced.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, header_length = PREAMBLE.unpack_from(mapped)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a model file")
+    if version != VERSION:
+        raise ValueError(f"{path} has unsupported model file version {version}")
+    header = json.loads(mapped[PREAMBLE.size : PREAMBLE.size + header_length])
+    if kind is not None and header["kind"] != kind:
+        raise ValueError(f"{path} holds a {header['kind']} model, not {kind}")
+    if header["byteorder"] != sys.byteorder:
+        raise ValueError(f"{path} was written on a {header['byteorder']}-endian host")
+
+    data_start = align(PREAMBLE.size + header_length)
+    view = memoryview(mapped)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        start = data_start + spec["offset"]
+        itemsize = array(spec["typecode"]).itemsize
+        arrays[name] = view[start : start + spec["length"] * itemsize].cast(
+            spec["typecode"]
+        )
+    return ModelFile(header["kind"], header["meta"], arrays)
+
+
+def save_centroids(path: str, centroids: Sequence[Sequence[float]]):
+    """
+    Save k-means centroids as one row-major array of doubles.
+    """
+    dim = len(centroids[0]) if centroids else 0
+    flat = array("d", (coord for centroid in centroids for coord in centroid))
+    save(path, "kmeans", {"centroids": flat}, {"k": len(centroids), "dim": dim})
+
+
+def load_centroids(path: str) -> List[memoryview]:
+    """
+    Load k-means centroids saved by save_centroids(), each one a view into the mapped file.
+    """
+    model = load(path, "kmeans")
+    k, dim = model.meta["k"], model.meta["dim"]
+    flat = model.arrays["centroids"]
+    return [flat[i * dim : (i + 1) * dim] for i in range(k)]
+
+
+def align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,37 @@
+"""
+Imports of the modules of this repository by file name, including the ones with a hyphen in their file name
+(k-means.py, hierarchical-clustering.py, clustering-evaluation.py):
+
+    kmeans = modules.load("k-means.py")
+
+A module is registered in sys.modules under its file name with hyphens turned into underscores ("k_means"), so every
+caller in a process shares one copy of it, and process pools can pickle its functions and classes.
+"""
+
+import importlib.util
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def module_name(filename: str) -> str:
+    return os.path.splitext(filename)[0].replace("-", "_")
+
+
+def load(filename: str):
+    name = module_name(filename)
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    module = importlib.util.module_from_spec(spec)
+    # registered before running it, so the pickling of process pools can find the module again
+    sys.modules[name] = module
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
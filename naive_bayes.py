@@ -1,10 +1,27 @@
 # Submit this file to Gradescope
 import math
-from typing import Dict, List, Tuple
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import sys
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, List, Sequence, Tuple
+
+# the repository modules are imported where they are used, so this file also works on its own
+if TYPE_CHECKING:
+    from dataset import Dataset
+
 # You may use any built-in standard Python libraries
 # You may NOT use any non-standard Python libraries such as numpy, scikit-learn, etc.
 
 num_C = 7  # Represents the total number of classes
+LOG_UNSEEN = math.log(0.1)  # The smoothed log count of an unseen attr-label comb
+
+
+def is_dataset(data) -> bool:
+    # a Dataset exists only once dataset.py is imported, so this file does not need to import it
+    dataset = sys.modules.get("dataset")
+    return dataset is not None and isinstance(data, dataset.Dataset)
 
 
 class Solution:
@@ -38,52 +55,385 @@ class Solution:
         Returns:
           A list of length M where M is the number of datapoints in the test set
         """
-        # calculate the counts of attributes
-        attr_counts = [{} for _ in range(len(X_train[0]))]
-        possible_values = [set() for i in range(len(X_train[0]))]
-        for label, datapoint in zip(Y_train, X_train):
+        return NaiveBayesModel().fit(X_train, Y_train).predict(X_test)
+
+
+class NaiveBayesModel:
+    """A Naive Bayes model trained incrementally and scored in log space.
+
+    The values of every attribute are encoded to dense integer codes, and the counts of
+    attribute i are kept in attr_counts[i] as one row of num_C entries per code. The
+    smoothed log P(x_i = v | y) is cached split into a numerator log(count + 0.1) per cell
+    (log_numerators[i], same layout as the counts) and a denominator
+    log(class count + 0.1 * number of values) per attribute and class
+    (log_denominators[i]). partial_fit only marks the cells it touched, and the next
+    predict recomputes those cells and the num_C * attributes denominators, nothing more.
+
+    Scoring a datapoint gathers one numerator row per attribute, a constant fallback row
+    for values never seen before, and sums them per class onto a per-class bias (the log
+    prior minus the sum of the log denominators). Labels whose log scores are within
+    rounding error of each other are settled by the product of the raw probabilities, as
+    Solution.label always did, unless that product underflows.
+    """
+
+    def __init__(self):
+        self.N = 0
+        self.class_counts = [0] * num_C
+        self.codes: List[Dict[Hashable, int]] = []
+        self.attr_counts: List[array] = []
+        self.log_numerators: List[array] = []
+        self.log_denominators: List[array] = []
+        self.dirty: List[set] = []
+        self.stale = False
+
+    def fit(
+        self, X_train: "List[List[int]] | Dataset", Y_train: List[int] | None = None
+    ) -> "NaiveBayesModel":
+        """Train a fresh model on the training set
+        Args:
+          X_train: Row i represents the i-th training datapoint, or a Dataset (e.g. read with typecode "q")
+          Y_train: The i-th integer represents the class label for the i-th training datapoint, or None to use the
+            labels of a Dataset
+        Returns:
+          The fitted model
+        """
+        self.__init__()
+        return self.partial_fit(X_train, Y_train)
+
+    def fit_chunks(
+        self, chunks: Iterable[Tuple[List[List[int]], List[int]]]
+    ) -> "NaiveBayesModel":
+        """Train on a stream of training chunks, holding one chunk in memory at a time
+        Args:
+          chunks: An iterable (e.g. a generator) of (X_chunk, Y_chunk) pairs
+        Returns:
+          The fitted model
+        """
+        for X_chunk, Y_chunk in chunks:
+            self.partial_fit(X_chunk, Y_chunk)
+        return self
+
+    def fit_sharded(
+        self,
+        shards: Iterable[Tuple[List[List[int]], List[int]] | str],
+        n_jobs: int | None = None,
+        max_in_flight: int | None = None,
+    ) -> "NaiveBayesModel":
+        """Train a fresh model on shards of the training set counted in parallel, see partial_fit_sharded
+        Returns:
+          The fitted model, the same as fit() on all the shards one after the other
+        """
+        self.__init__()
+        return self.partial_fit_sharded(shards, n_jobs, max_in_flight)
+
+    def partial_fit_sharded(
+        self,
+        shards: Iterable[Tuple[List[List[int]], List[int]] | str],
+        n_jobs: int | None = None,
+        max_in_flight: int | None = None,
+    ) -> "NaiveBayesModel":
+        """Add shards of training datapoints to the counts, counting each shard in a worker process (map) and
+        merging the partial tables into this model in shard order (reduce)
+        Args:
+          shards: An iterable of (X_shard, Y_shard) pairs, or of paths of saved Datasets that the workers load
+            themselves so the shard is not pickled
+          n_jobs: The number of worker processes, -1 for one per CPU; None or 1 counts in this process
+          max_in_flight: The most shards submitted and not merged yet, 2 * n_jobs by default, which bounds the
+            memory held by shards and partial tables
+        Returns:
+          The updated model, the same as partial_fit() on every shard in order
+        """
+        n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        if n_jobs is None or n_jobs <= 1:
+            for shard in shards:
+                self.merge(count_shard(shard))
+            return self
+
+        max_in_flight = max_in_flight or 2 * n_jobs
+        with ProcessPoolExecutor(n_jobs) as pool:
+            pending = deque()
+            for shard in shards:
+                pending.append(pool.submit(count_shard, shard))
+                if len(pending) >= max_in_flight:
+                    self.merge(pending.popleft().result())
+            while pending:
+                self.merge(pending.popleft().result())
+        return self
+
+    def merge(self, other: "NaiveBayesModel") -> "NaiveBayesModel":
+        """Add the counts of another model, trained on other datapoints, to this one
+        Values new to this model are coded in the order other coded them, so merging the models of consecutive
+        shards in order gives the same model as training on the shards one after the other, and merging is
+        associative: (a.merge(b)).merge(c) equals a.merge(b.merge(c)).
+        Args:
+          other: The model to merge, which is left unchanged
+        Returns:
+          The updated model
+        """
+        if not other.codes:
+            return self
+        self.thaw()
+        if not self.codes:
+            self.add_attributes(len(other.codes))
+        elif len(self.codes) != len(other.codes):
+            raise ValueError(
+                f"cannot merge a model of {len(other.codes)} attributes into one of {len(self.codes)}"
+            )
+        self.N += other.N
+        for label, count in enumerate(other.class_counts):
+            self.class_counts[label] += count
+
+        for i, other_codes in enumerate(other.codes):
+            codes, attr_counts, dirty = (
+                self.codes[i],
+                self.attr_counts[i],
+                self.dirty[i],
+            )
+            other_counts = other.attr_counts[i]
+            # other's codes follow the order its values first appeared in
+            for attr, other_code in other_codes.items():
+                code = codes.setdefault(attr, len(codes))
+                if code * num_C == len(attr_counts):
+                    attr_counts.extend([0] * num_C)
+                    self.log_numerators[i].extend([LOG_UNSEEN] * num_C)
+                for label in range(num_C):
+                    count = other_counts[other_code * num_C + label]
+                    if count:
+                        cell = code * num_C + label
+                        attr_counts[cell] += count
+                        dirty.add(cell)
+        self.stale = True
+        return self
+
+    def partial_fit(
+        self, X_chunk: "List[List[int]] | Dataset", Y_chunk: List[int] | None = None
+    ) -> "NaiveBayesModel":
+        """Add a chunk of training datapoints to the counts
+        Args:
+          X_chunk: Row i represents the i-th training datapoint of the chunk, or a Dataset
+          Y_chunk: The i-th integer represents the class label for the i-th datapoint, or None to use the labels
+            of a Dataset
+        Returns:
+          The updated model
+        """
+        if is_dataset(X_chunk):
+            labels = X_chunk.labels if Y_chunk is None else Y_chunk
+            return self.partial_fit_columns(X_chunk.columns, labels)
+
+        self.thaw()
+        for label, datapoint in zip(Y_chunk, X_chunk):
+            if not self.codes:
+                self.add_attributes(len(datapoint))
+            self.N += 1
+            self.class_counts[label - 1] += 1
             for i, attr in enumerate(datapoint):
-                # the key for the dict
-                key = (label, attr)
+                code = self.codes[i].setdefault(attr, len(self.codes[i]))
+                if code * num_C == len(self.attr_counts[i]):
+                    # a new value, its cells start out as unseen
+                    self.attr_counts[i].extend([0] * num_C)
+                    self.log_numerators[i].extend([LOG_UNSEEN] * num_C)
+                cell = code * num_C + label - 1
+                self.attr_counts[i][cell] += 1
+                self.dirty[i].add(cell)
+            self.stale = True
+        return self
 
-                # for counting the frequencies of x_i given y
-                attr_counts[i][key] = attr_counts[i].get(key, 0) + 1
+    def partial_fit_columns(
+        self, columns: List[Sequence[int]], labels: Sequence[int]
+    ) -> "NaiveBayesModel":
+        """Add a chunk of training datapoints given as attribute columns to the counts, one column at a time. The
+        values are coded in the same order as by partial_fit, so the model is the same.
+        Args:
+          columns: Column i holds attribute i of every datapoint of the chunk
+          labels: The i-th integer represents the class label for the i-th datapoint
+        Returns:
+          The updated model
+        """
+        self.thaw()
+        if not len(labels):
+            return self
+        if not self.codes:
+            self.add_attributes(len(columns))
+        self.N += len(labels)
+        for label in labels:
+            self.class_counts[label - 1] += 1
 
-                # for counting possible values
-                possible_values[i].add(attr)
+        for i, column in enumerate(columns):
+            codes, attr_counts, dirty = (
+                self.codes[i],
+                self.attr_counts[i],
+                self.dirty[i],
+            )
+            for attr, label in zip(column, labels):
+                code = codes.setdefault(attr, len(codes))
+                if code * num_C == len(attr_counts):
+                    # a new value, its cells start out as unseen
+                    attr_counts.extend([0] * num_C)
+                    self.log_numerators[i].extend([LOG_UNSEEN] * num_C)
+                cell = code * num_C + label - 1
+                attr_counts[cell] += 1
+                dirty.add(cell)
+        self.stale = True
+        return self
 
-        # calculate the conditional probabilities of x_i given y
-        class_counts = self.get_class_count(Y_train)
-        for i, attr_count in enumerate(attr_counts):
-            # iterate through the counting dicts and calculate the probabilities
-            for (label, attr), count in attr_count.items():
-                attr_count[label, attr] = (count + 0.1) / (
-                    class_counts[label - 1] + 0.1 * len(possible_values[i])
-                )
-
-        # calculate the result for the test set
+    def save(self, path: str):
+        """Save the counts and the cached probabilities to a model file
+        Args:
+          path: The file to write. Attribute values must be integers.
+        """
+        self.refresh()
+        arrays = {
+            "class_counts": array("q", self.class_counts),
+            "priors": array("d", self.priors),
+            "biases": array("d", self.biases),
+        }
+        for i, codes in enumerate(self.codes):
+            if not all(type(attr) is int for attr in codes):
+                raise TypeError(f"attribute {i} has non-integer values")
+            arrays[f"values.{i}"] = array("q", codes)
+            arrays[f"attr_counts.{i}"] = self.attr_counts[i]
+            arrays[f"log_numerators.{i}"] = self.log_numerators[i]
+            arrays[f"log_denominators.{i}"] = self.log_denominators[i]
+        import model_io
+
+        model_io.save(
+            path, "naive_bayes", arrays, {"N": self.N, "num_attrs": len(self.codes)}
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "NaiveBayesModel":
+        """Load a model saved by save()
+        Args:
+          path: The model file
+        Returns:
+          The model, its tables memory-mapped from the file until partial_fit copies them
+        """
+        import model_io
+
+        stored = model_io.load(path, "naive_bayes")
+        arrays = stored.arrays
+        model = cls()
+        model.N = stored.meta["N"]
+        model.class_counts = arrays["class_counts"].tolist()
+        model.priors = arrays["priors"]
+        model.biases = arrays["biases"]
+        for i in range(stored.meta["num_attrs"]):
+            values = arrays[f"values.{i}"]
+            model.codes.append(dict(zip(values, range(len(values)))))
+            model.attr_counts.append(arrays[f"attr_counts.{i}"])
+            model.log_numerators.append(arrays[f"log_numerators.{i}"])
+            model.log_denominators.append(arrays[f"log_denominators.{i}"])
+            model.dirty.append(set())
+        return model
+
+    def thaw(self):
+        """Copy memory-mapped tables into arrays so they can be updated"""
+        for tables in (self.attr_counts, self.log_numerators, self.log_denominators):
+            for i, table in enumerate(tables):
+                if isinstance(table, memoryview):
+                    tables[i] = array(table.format, table)
+
+    def add_attributes(self, num_attrs: int):
+        self.codes = [{} for _ in range(num_attrs)]
+        self.attr_counts = [array("q") for _ in range(num_attrs)]
+        self.log_numerators = [array("d") for _ in range(num_attrs)]
+        self.log_denominators = [array("d", [0.0] * num_C) for _ in range(num_attrs)]
+        self.dirty = [set() for _ in range(num_attrs)]
+
+    def refresh(self):
+        """Recompute the cached probabilities invalidated since the last refresh"""
+        if not self.stale:
+            return
+
+        # only the cells whose counts changed get a new numerator
+        for counts, log_numerators, dirty in zip(
+            self.attr_counts, self.log_numerators, self.dirty
+        ):
+            for cell in dirty:
+                log_numerators[cell] = math.log(counts[cell] + 0.1)
+            dirty.clear()
+
+        # the denominators follow the class counts and the number of possible values
+        for codes, log_denominators in zip(self.codes, self.log_denominators):
+            for label, count in enumerate(self.class_counts):
+                log_denominators[label] = math.log(count + 0.1 * len(codes))
+
+        self.priors = [
+            (count + 0.1) / (self.N + 0.1 * num_C) for count in self.class_counts
+        ]
+        self.biases = [
+            math.log(prior)
+            - sum(log_denominators[label] for log_denominators in self.log_denominators)
+            for label, prior in enumerate(self.priors)
+        ]
+        self.stale = False
+
+    def predict(self, X_test: List[List[int]]) -> List[int]:
+        """Calculate the most likely label of each test datapoint
+        Args:
+          X_test: Row i represents the i-th testing datapoint
+        Returns:
+          A list of length M where M is the number of datapoints in the test set
+        """
+        self.refresh()
+        unseen = [LOG_UNSEEN] * num_C
         results = []
-        priors = self.prior(X_train, Y_train)
         for datapoint in X_test:
-            best_prob = float("-inf")
-            best_label = -1
-
-            # iterate over all the labels to test out all the x give y (label)
-            for label in range(1, num_C + 1):
-                prob = priors[label - 1]
-                # iterate over all the attributes
-                for i, attr in enumerate(datapoint):
-                    attr_count = attr_counts[i]
-                    prob *= attr_count.get(
-                        (label, attr),
-                        # in case there the attr-label comb is unseen before
-                        0.1 / (class_counts[label - 1] + 0.1 * len(possible_values[i])),
-                    )
-
-                # update it to the best possible label
-                if prob > best_prob:
-                    best_prob = prob
-                    best_label = label
-            results.append(best_label)
+            # gather the numerators of every attribute, unseen values use the fallback
+            rows = []
+            for codes, log_numerators, attr in zip(
+                self.codes, self.log_numerators, datapoint
+            ):
+                code = codes.get(attr)
+                if code is None:
+                    rows.append(unseen)
+                else:
+                    rows.append(log_numerators[code * num_C : (code + 1) * num_C])
 
+            # sum up the log probabilities per label, the smaller label wins ties
+            scores = [*map(sum, zip(self.biases, *rows))]
+            best = max(range(num_C), key=scores.__getitem__)
+            tolerance = 1e-9 * (1 + abs(scores[best]))
+            if sum(scores[best] - score <= tolerance for score in scores) > 1:
+                best = self.product_label(datapoint, best)
+            results.append(best + 1)
         return results
+
+    def product_label(self, datapoint: List[int], fallback: int) -> int:
+        """Pick the label index with the largest product of raw probabilities
+        Args:
+          datapoint: The test datapoint
+          fallback: The label index to return if every product underflows to 0
+        Returns:
+          The label index, the smaller one winning ties
+        """
+        best_prob = 0.0
+        best_label = fallback
+        for label in range(num_C):
+            prob = self.priors[label]
+            for codes, counts, attr in zip(self.codes, self.attr_counts, datapoint):
+                code = codes.get(attr)
+                count = 0 if code is None else counts[code * num_C + label]
+                prob *= (count + 0.1) / (self.class_counts[label] + 0.1 * len(codes))
+            if prob > best_prob:
+                best_prob = prob
+                best_label = label
+        return best_label
+
+
+def count_shard(shard: Tuple[List[List[int]], List[int]] | str) -> NaiveBayesModel:
+    """Count one shard of training datapoints into a model of its own, the partial table of partial_fit_sharded
+    Args:
+      shard: An (X_shard, Y_shard) pair, or the path of a saved Dataset
+    Returns:
+      The counts of the shard as a model to merge
+    """
+    if isinstance(shard, str):
+        from dataset import Dataset
+
+        shard = (Dataset.load(shard), None)
+    model = NaiveBayesModel().partial_fit(*shard)
+    # only the counts are merged, so the cached numerators need not travel back
+    model.log_numerators = [array("d") for _ in model.codes]
+    model.dirty = [set() for _ in model.codes]
+    return model
@@ -0,0 +1,276 @@
+"""
+A random forest: a bagged ensemble of decision_tree trees, each grown on a bootstrap sample of the training rows with
+the split of every node searched over a random subset of the features.
+
+    forest = RandomForest(n_estimators=100, seed=0, n_jobs=4).fit(train_data, train_label)
+    predictions = forest.predict(test_data)
+
+Every tree draws its bootstrap sample and its feature subsets from its own seed, and the seeds are drawn from the
+forest's seed up front, so the trees are the same whichever worker grows them and however many workers there are.
+With n_jobs, the trees are grown across a process pool: the training columns, the labels and the presorted order of
+every feature live in one shared memory block that each worker attaches to once, so a task only carries a seed and
+the training set is neither pickled nor sorted again per worker or per tree. Predictions are the majority vote of
+the trees, ties going to the smaller label as in decision_tree.Node.
+"""
+
+import math
+import os
+import random
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Sequence
+
+import model_io
+from dataset import Dataset
+from decision_tree import (
+    FlatTree,
+    Node,
+    Solution,
+    SplitEngine,
+    shared_engine,
+    shared_views,
+)
+
+
+class RandomForest:
+    """
+    Parameters:
+    n_estimators (int): The number of trees.
+    max_depth (int | None): The maximum depth of every tree, None for fully grown trees.
+    min_samples_leaf (int): The minimum number of training rows on each side of a split.
+    max_features (int | str | None): The number of features searched at every node: an int, "sqrt" or "log2" of the
+    number of features, or None for all of them (plain bagging).
+    bootstrap (bool): Grow every tree on a bootstrap sample of the training rows, or on all of them.
+    seed (int | None): Seeds the whole forest.
+    n_jobs (int | None): The number of worker processes growing trees, -1 for one per CPU. None or 1 grows them in
+    this process.
+
+    After fit():
+    - trees: The FlatTree of every estimator, in seed order
+    """
+
+    def __init__(
+        self,
+        n_estimators: int = 100,
+        max_depth: int | None = None,
+        min_samples_leaf: int = 1,
+        max_features: int | str | None = "sqrt",
+        bootstrap: bool = True,
+        seed: int | None = None,
+        n_jobs: int | None = None,
+    ):
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.max_features = max_features
+        self.bootstrap = bootstrap
+        self.seed = seed
+        self.n_jobs = n_jobs
+        self.trees: List[FlatTree] = []
+
+    def features_per_node(self, d: int) -> int | None:
+        if self.max_features is None:
+            return None
+        if self.max_features == "sqrt":
+            return max(1, int(math.sqrt(d)))
+        if self.max_features == "log2":
+            return max(1, int(math.log2(d)))
+        if isinstance(self.max_features, str):
+            raise ValueError(f"unknown max_features {self.max_features!r}")
+        return min(self.max_features, d)
+
+    def fit(
+        self,
+        train_data: List[List[float]] | Dataset,
+        train_label: List[int] | None = None,
+    ) -> "RandomForest":
+        """
+        Grow the trees. train_data may be a list of rows or a Dataset, whose labels are used if train_label is None.
+        """
+        if isinstance(train_data, Dataset):
+            columns = train_data.columns
+            if train_label is None:
+                train_label = train_data.labels
+        else:
+            columns = [
+                [row[i] for row in train_data] for i in range(len(train_data[0]))
+            ]
+        params = {
+            "max_depth": self.max_depth,
+            "min_samples_leaf": self.min_samples_leaf,
+            "max_features": self.features_per_node(len(columns)),
+            "bootstrap": self.bootstrap,
+        }
+        master = random.Random(self.seed)
+        seeds = [master.getrandbits(64) for _ in range(self.n_estimators)]
+
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        if n_jobs is None or n_jobs <= 1:
+            # the same float values the workers read from the shared block
+            columns = [array("d", column) for column in columns]
+            grower = TreeGrower(
+                SplitEngine(
+                    columns, train_label, Solution().info, self.min_samples_leaf
+                ),
+                **params,
+            )
+            self.trees = [grower.grow(seed) for seed in seeds]
+            return self
+
+        shared = share_training_set(columns, train_label)
+        try:
+            with ProcessPoolExecutor(
+                n_jobs,
+                initializer=attach_forest,
+                initargs=(shared.name, len(train_label), len(columns), params),
+            ) as pool:
+                self.trees = list(pool.map(grow_shared_tree, seeds))
+        finally:
+            shared.close()
+            shared.unlink()
+        return self
+
+    def predict(self, data: List[List[float]] | Dataset) -> List[int]:
+        """
+        Predict the label of every datapoint in data by majority vote of the trees, ties going to the smaller label.
+        """
+        votes = [tree.predict(data) for tree in self.trees]
+        predictions = []
+        for row_votes in zip(*votes):
+            counts = Counter(row_votes)
+            top = max(counts.values())
+            predictions.append(min(k for k, v in counts.items() if v == top))
+        return predictions
+
+    def classify(
+        self,
+        train_data: List[List[float]],
+        train_label: List[int],
+        test_data: List[List[float]],
+    ) -> List[int]:
+        self.fit(train_data, train_label)
+        return self.predict(test_data)
+
+    def save(self, path: str):
+        """
+        Save the trees, concatenated into one set of flat arrays, and the forest's parameters to a model file.
+        """
+        arrays = {
+            "split_dim": array("q"),
+            "split_point": array("d"),
+            "left": array("q"),
+            "right": array("q"),
+            "label": array("q"),
+            "offsets": array("q", [0]),
+        }
+        for tree in self.trees:
+            for name in ("split_dim", "split_point", "left", "right", "label"):
+                arrays[name].extend(getattr(tree, name))
+            arrays["offsets"].append(len(arrays["label"]))
+        model_io.save(
+            path,
+            "random_forest",
+            arrays,
+            {
+                "n_estimators": self.n_estimators,
+                "max_depth": self.max_depth,
+                "min_samples_leaf": self.min_samples_leaf,
+                "max_features": self.max_features,
+                "bootstrap": self.bootstrap,
+                "seed": self.seed,
+            },
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RandomForest":
+        """
+        Load a forest saved by 'save()'. Every tree is a memory-mapped slice of the file's arrays.
+        """
+        model = model_io.load(path, "random_forest")
+        forest = cls(**model.meta)
+        offsets = model.arrays["offsets"]
+        forest.trees = [
+            FlatTree(
+                *(
+                    model.arrays[name][start:end]
+                    for name in ("split_dim", "split_point", "left", "right", "label")
+                )
+            )
+            for start, end in zip(offsets, offsets[1:])
+        ]
+        return forest
+
+
+class TreeGrower:
+    """
+    Grows the trees of a forest from their seeds over one SplitEngine, whose presorted feature orders are reused by
+    every tree.
+    """
+
+    def __init__(
+        self,
+        engine: SplitEngine,
+        max_depth: int | None,
+        min_samples_leaf: int,
+        max_features: int | None,
+        bootstrap: bool,
+    ):
+        self.engine = engine
+        self.solution = Solution(
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            max_features=max_features,
+        )
+        self.bootstrap = bootstrap
+
+    def grow(self, seed: int) -> FlatTree:
+        rng = random.Random(seed)
+        n = len(self.engine.labels)
+        rows = rng.choices(range(n), k=n) if self.bootstrap else range(n)
+        root = Node()
+        self.solution.split_node(root, self.engine, *self.engine.root(rows), 0, rng)
+        return FlatTree.from_node(root)
+
+
+def share_training_set(
+    columns: List[Sequence[float]], labels: Sequence[int]
+) -> shared_memory.SharedMemory:
+    """
+    Copy the training columns, labels and per-feature presorted orders into a new shared block, laid out as
+    shared_views() followed by n * d int64 row ids.
+    """
+    n, d = len(labels), len(columns)
+    shared = shared_memory.SharedMemory(create=True, size=max(1, 8 * n * (2 * d + 1)))
+    shared_columns, shared_labels = shared_views(shared, n, d)
+    with shared.buf[8 * n * (d + 1) :].cast("q") as orders:
+        for i, column in enumerate(columns):
+            column = array("d", column)
+            shared_columns[i * n : (i + 1) * n] = column
+            orders[i * n : (i + 1) * n] = array(
+                "q", sorted(range(n), key=column.__getitem__)
+            )
+    shared_labels[:] = array("q", labels)
+    shared_columns.release()
+    shared_labels.release()
+    return shared
+
+
+# the tree grower of a pool worker, attached to the parent's shared training set
+_grower: TreeGrower | None = None
+
+
+def attach_forest(name: str, n: int, d: int, params: dict):
+    """
+    Pool initializer: attach to the shared training set and build this worker's TreeGrower over it.
+    """
+    global _grower
+    engine = shared_engine(name, n, d, params["min_samples_leaf"])
+    orders = engine.shared.buf[8 * n * (d + 1) : 8 * n * (2 * d + 1)].cast("q")
+    engine.presorted = [orders[i * n : (i + 1) * n] for i in range(d)]
+    _grower = TreeGrower(engine, **params)
+
+
+def grow_shared_tree(seed: int) -> FlatTree:
+    return _grower.grow(seed)
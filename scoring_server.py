@@ -0,0 +1,338 @@
+"""
+A local scoring service that keeps fitted models loaded and answers prediction requests over a Unix socket or a
+localhost TCP port.
+
+    python scoring_server.py tree=tree.model nb=nb.model --unix /tmp/scoring.sock [--max-batch 64] [--max-delay-ms 2]
+
+Models are model_io files saved by decision_tree.Solution, naive_bayes.NaiveBayesModel, random_forest.RandomForest or
+k-means, loaded once at startup (their arrays memory-mapped) under the given names. The protocol is one JSON object
+per line in each direction:
+
+    {"id": 1, "model": "tree", "row": [5.1, 3.5, 1.4, 0.2]}   ->   {"id": 1, "label": 0}
+    {"id": 2, "model": "tree", "rows": [[...], [...]]}         ->   {"id": 2, "labels": [0, 2]}
+    {"id": 3, "op": "stats"}                                    ->   {"id": 3, "stats": {...}}
+
+Requests on one connection are answered as they complete, so a client may pipeline them and match the answers by
+id. Every model has a queue and a batcher task: the batcher takes the first waiting request, keeps collecting until
+it holds max_batch rows or the first request has waited max_delay, and predicts the whole batch with one call on a
+worker thread while the event loop goes on queueing requests; if that call fails, every request of the batch is
+predicted on its own so that only the bad ones get the error. Concurrent single-row requests are thus coalesced into
+micro-batches at a cost of at most max_delay of added latency. The stats report the queue depth, the number of
+requests, rows and batches, and the p50/p99 latency from arrival to answer over the most recent requests of every
+model.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import model_io
+import modules
+
+# the latencies kept per model for the percentiles
+LATENCY_WINDOW = 10000
+
+
+def load_decision_tree(path: str) -> Callable[[List[list]], List[int]]:
+    import decision_tree
+
+    return decision_tree.Solution.load(path).predict_batch
+
+
+def load_naive_bayes(path: str) -> Callable[[List[list]], List[int]]:
+    import naive_bayes
+
+    return naive_bayes.NaiveBayesModel.load(path).predict
+
+
+def load_random_forest(path: str) -> Callable[[List[list]], List[int]]:
+    import random_forest
+
+    return random_forest.RandomForest.load(path).predict
+
+
+def load_kmeans(path: str) -> Callable[[List[list]], List[int]]:
+    kmeans = modules.load("k-means.py")
+    return kmeans.KMeans.load(path).predict
+
+
+# the loader of every kind of model file, returning the model's batch predict function
+LOADERS = {
+    "decision_tree": load_decision_tree,
+    "naive_bayes": load_naive_bayes,
+    "random_forest": load_random_forest,
+    "kmeans": load_kmeans,
+}
+
+
+def load_model(path: str) -> Callable[[List[list]], List[int]]:
+    kind = model_io.load(path).kind
+    if kind not in LOADERS:
+        raise ValueError(f"{path} holds a {kind} model, which cannot be served")
+    return LOADERS[kind](path)
+
+
+class Batcher:
+    """
+    Coalesces the prediction requests of one model into micro-batches.
+
+    Parameters:
+    predict (Callable[[List[list]], List[int]]): Predicts the labels of a list of rows.
+    max_batch (int): The most rows predicted in one call. A request is never split, so a larger request makes a
+    batch of its own.
+    max_delay (float): The longest, in seconds, the first request of a batch waits for more requests.
+    """
+
+    def __init__(
+        self,
+        predict: Callable[[List[list]], List[int]],
+        max_batch: int = 64,
+        max_delay: float = 0.002,
+    ):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue: asyncio.Queue = asyncio.Queue()
+        # a request that did not fit into the last batch, first in the next one
+        self.carry: tuple | None = None
+        self.latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def submit(self, rows: List[list]) -> List[int]:
+        """
+        Queue rows for prediction and wait for their labels.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((rows, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self.carry is None:
+                batch = [await self.queue.get()]
+            else:
+                batch, self.carry = [self.carry], None
+            size = len(batch[0][0])
+            deadline = batch[0][2] + self.max_delay
+
+            # collect more requests until the batch is full or the first request has waited long enough
+            while size < self.max_batch:
+                if self.queue.empty():
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self.queue.get_nowait()
+                if size + len(item[0]) > self.max_batch:
+                    self.carry = item
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            rows = [row for request_rows, _, _ in batch for row in request_rows]
+            try:
+                labels = await loop.run_in_executor(None, self.predict, rows)
+                start = 0
+                outcomes = []
+                for request_rows, _, _ in batch:
+                    outcomes.append(labels[start : start + len(request_rows)])
+                    start += len(request_rows)
+            except Exception:
+                # a bad request must not fail the others, so predict every request of the batch on its own
+                outcomes = await loop.run_in_executor(None, self.predict_each, batch)
+
+            done = time.perf_counter()
+            for (_, future, arrival), outcome in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if isinstance(outcome, Exception):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+                    self.latencies.append(done - arrival)
+            self.requests += len(batch)
+            self.rows += len(rows)
+            self.batches += 1
+
+    def predict_each(self, batch: List[tuple]) -> List[List[int] | Exception]:
+        # the labels of every request of a batch, or the error predicting it raised
+        outcomes = []
+        for rows, _, _ in batch:
+            try:
+                outcomes.append(self.predict(rows))
+            except Exception as error:
+                outcomes.append(error)
+        return outcomes
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "queue_depth": self.queue.qsize() + (self.carry is not None),
+            "requests": self.requests,
+            "rows": self.rows,
+            "batches": self.batches,
+            "mean_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "p50_ms": 1000 * percentile(latencies, 0.50),
+            "p99_ms": 1000 * percentile(latencies, 0.99),
+        }
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    # the nearest-rank percentile of sorted values, 0.0 if there are none
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, math.ceil(len(values) * q) - 1))]
+
+
+class ScoringServer:
+    """
+    Serves the predictions of named models, one Batcher per model.
+
+    Parameters:
+    models (Dict[str, Callable[[List[list]], List[int]]]): The batch predict function of every model by name.
+    max_batch (int), max_delay (float): The batching limits of every model, see Batcher.
+    """
+
+    def __init__(
+        self,
+        models: Dict[str, Callable[[List[list]], List[int]]],
+        max_batch: int = 64,
+        max_delay: float = 0.002,
+    ):
+        self.batchers = {
+            name: Batcher(predict, max_batch, max_delay)
+            for name, predict in models.items()
+        }
+        self.started = time.time()
+
+    async def start(
+        self, unix_path: str | None = None, host: str = "127.0.0.1", port: int = 0
+    ) -> asyncio.AbstractServer:
+        """
+        Start the batchers and listen on a Unix socket if unix_path is given, else on host:port.
+        """
+        for batcher in self.batchers.values():
+            batcher.start()
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle, path=unix_path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        # stop the batchers, requests still queued are left unanswered
+        for batcher in self.batchers.values():
+            if batcher.task is not None:
+                batcher.task.cancel()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # answer the requests of one connection concurrently, so they can share batches
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.answer(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+    async def answer(self, line: bytes, writer: asyncio.StreamWriter):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            response = await self.respond(request)
+        except Exception as error:
+            response = {"error": f"{type(error).__name__}: {error}"}
+        response["id"] = request_id
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+
+    async def respond(self, request: dict) -> dict:
+        if request.get("op") == "stats":
+            return {"stats": self.stats()}
+        name = request.get("model")
+        if name not in self.batchers:
+            raise KeyError(f"unknown model {name!r}")
+        batcher = self.batchers[name]
+        rows = [request["row"]] if "row" in request else request["rows"]
+        if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
+            raise ValueError("rows must be lists of values")
+        labels = await batcher.submit(rows)
+        if "row" in request:
+            return {"label": labels[0]}
+        return {"labels": labels}
+
+    def stats(self) -> dict:
+        return {
+            "uptime_s": time.time() - self.started,
+            "models": {
+                name: batcher.stats() for name, batcher in self.batchers.items()
+            },
+        }
+
+
+def parse_models(specs: List[str]) -> List[Tuple[str, str]]:
+    models = []
+    for spec in specs:
+        name, sep, path = spec.partition("=")
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(spec))[0], spec
+        models.append((name, path))
+    return models
+
+
+async def serve(args: argparse.Namespace):
+    models = {name: load_model(path) for name, path in parse_models(args.models)}
+    server = ScoringServer(models, args.max_batch, args.max_delay_ms / 1000)
+    listener = await server.start(args.unix, args.host, args.port)
+    for socket in listener.sockets:
+        print(f"serving {', '.join(models)} on {socket.getsockname()}", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Serve the predictions of fitted models over a local socket."
+    )
+    parser.add_argument(
+        "models",
+        nargs="+",
+        help="model files to serve as name=path, or path to use the file name",
+    )
+    parser.add_argument("--unix", help="listen on this Unix socket path")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8412)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
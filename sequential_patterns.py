@@ -0,0 +1,131 @@
+"""
+Contiguous sequential pattern mining over a file of transactions, one transaction of space-separated words per line.
+
+    python sequential_patterns.py ["Reviews Sample.txt"] [--min-sup 0.01] [-o answer.txt]
+
+Like PreSpan.cpp, a pattern is a run of consecutive words and its support is the number of transactions containing
+it; a pattern is frequent when count / transactions >= min_sup. The words are interned to integer ids in one token
+array shared by the whole search, where every transaction ends with a -1 separator. A pattern is grown PrefixSpan
+style from its pseudo-projection: the positions in the token array right after each of its occurrences, so projecting
+never copies words and an extension is just the token at a projected position. Patterns grow depth-first, and the
+projections of a pattern's frequent extensions wait on the stack until they are explored; being disjoint subsets of
+the pattern's own projection, those of one pattern add up to at most its size, so the alive projections hold at most
+one position per token for every level of the current pattern's path. Every frequent pattern is written to answer.txt
+as a "count:word;word" line.
+"""
+
+import argparse
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from frequent_itemsets import min_support_count
+
+DELIMITER = ";"
+MIN_SUP = 0.01
+
+
+class Corpus:
+    """
+    The transactions of a file as one array of word ids.
+
+    Attributes:
+    - words: The word of every id
+    - tokens: The word ids of all the transactions, each transaction followed by -1
+    - ends: The position in tokens of the separator ending every transaction
+    - total: The number of transactions
+    """
+
+    def __init__(self):
+        self.words: List[str] = []
+        self.tokens = array("l")
+        self.ends = array("l")
+        self.total = 0
+
+    @classmethod
+    def read(cls, path: str) -> "Corpus":
+        corpus = cls()
+        ids: Dict[str, int] = {}
+        with open(path) as file:
+            for line in file:
+                corpus.add([word for word in line.rstrip("\n").split(" ") if word], ids)
+        corpus.words = list(ids)
+        return corpus
+
+    def add(self, words: Iterable[str], ids: Dict[str, int]):
+        # append one transaction, interning its words through ids
+        tokens = [ids.setdefault(word, len(ids)) for word in words]
+        tokens.append(-1)
+        self.tokens.extend(tokens)
+        self.ends.append(len(self.tokens) - 1)
+        self.total += 1
+
+
+def prefixspan(corpus: Corpus, min_count: int) -> Iterator[Tuple[int, List[int]]]:
+    """
+    Mine the frequent contiguous patterns depth-first.
+
+    Yields:
+    Tuple[int, List[int]]: The number of transactions containing every frequent pattern, and its word ids.
+    """
+    tokens, ends = corpus.tokens, corpus.ends
+    stack: List[Tuple[List[int], Iterable[int]]] = [([], range(len(tokens)))]
+    while stack:
+        prefix, projection = stack.pop()
+
+        # group the projected positions by the word extending the pattern there, counting each transaction once; the
+        # positions of a projection are ascending, so the end of the current transaction only moves forward
+        groups: Dict[int, list] = {}
+        end = -1
+        for p in projection:
+            word = tokens[p]
+            if word < 0:
+                continue
+            if p > end:
+                end = ends[bisect_left(ends, p)]
+            group = groups.get(word)
+            if group is None:
+                groups[word] = group = [end, 1, array("l")]
+            elif group[0] != end:
+                group[0] = end
+                group[1] += 1
+            group[2].append(p + 1)
+
+        for word, (_, count, child) in groups.items():
+            if count >= min_count:
+                pattern = prefix + [word]
+                yield count, pattern
+                stack.append((pattern, child))
+
+
+def mine(path: str, min_sup: float = MIN_SUP) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Find the frequent contiguous patterns of a transaction file.
+
+    Yields:
+    Tuple[int, List[str]]: The support count and words of every frequent pattern, in depth-first order.
+    """
+    corpus = Corpus.read(path)
+    if corpus.total == 0:
+        return
+    min_count = min_support_count(min_sup, corpus.total)
+    for count, pattern in prefixspan(corpus, min_count):
+        yield count, [corpus.words[word] for word in pattern]
+
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(
+        description="Mine the frequent contiguous word sequences of a file."
+    )
+    parser.add_argument("input", nargs="?", default="./Reviews Sample.txt")
+    parser.add_argument("--min-sup", type=float, default=MIN_SUP)
+    parser.add_argument("-o", "--output", default="answer.txt")
+    args = parser.parse_args(argv)
+
+    with open(args.output, "w") as f:
+        for count, words in mine(args.input, args.min_sup):
+            f.write(f"{count}:{DELIMITER.join(words)}\n")
+
+
+if __name__ == "__main__":
+    main()